@@ -0,0 +1,342 @@
+#! /usr/bin/python
+"""
+    Asynchronous fitness evaluation for the OOPS trainer.
+
+    Some fitness functions are slow and live outside the trainer: a
+    simulation, a scoring service, people rating the network's
+    output.  An AsyncEvaluator scores candidates as coroutines so a
+    whole batch of mutants can be out for scoring at once:
+
+        concurrency - most candidates in flight at once (default 16)
+        timeout     - seconds a candidate may take (default None:
+                      no limit).  A candidate that times out scores
+                      PartialFitness(-inf) so it never wins and is
+                      neither cached, counted in the fitness range
+                      nor credited to the weight affects.
+
+    Each Candidate carries its own snapshot of the weights and CEC
+    state it is to be scored with and its index in the batch, so
+    results arriving in any order are credited to the right mutant.
+
+    Subclasses implement the coroutine score(candidate).  The trainer
+    uses an AsyncEvaluator as its Evaluator (one candidate at a time,
+    taken from the Topology) and through an AsyncEvaluationPool for
+    whole batches:
+
+        from lstm_async import ProcessScorer,AsyncEvaluationPool
+        scorer=ProcessScorer(["./my_scorer"],concurrency=64,timeout=30)
+        Trainer=OOPS(Topology=net,Evaluator=scorer,
+                     Executor=AsyncEvaluationPool,batchSize=64)
+
+    ProcessScorer talks to an external process over its stdin and
+    stdout, one JSON object per line:
+
+        request:  {"id": n, "weights": [...], "state": [...]}
+        response: {"id": n, "fitness": f}
+
+    Responses may come back in any order.  Running this module
+    as "python lstm_async.py --fake-scorer" starts a local fake
+    scorer speaking this protocol, answering after random delays,
+    for trying out the machinery.
+
+    Copyright (C) 2013 Christopher BRIAN Jack (gau_veldt@hotmail.com)
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import sys
+import threading
+
+from lstm_oops import PartialFitness
+
+class Candidate:
+    """
+    One network to score: its place in the batch, a private copy
+    of its weights and starting CEC state, and the Budget bar
+    (fitness to beat, None when there is none)
+    """
+    def __init__(self,index,weights,state,bar=None):
+        self.index=index
+        self.weights=list(weights)
+        self.state=list(state)
+        self.bar=bar
+
+
+class AsyncEvaluator:
+    """
+    Evaluator scoring candidates with the coroutine score()
+
+    Coroutines run on an event loop in a background thread owned by
+    the evaluator, started on first use, so scoring works the same
+    whether or not the caller has an event loop of its own.
+    """
+    def __init__(self,concurrency=16,timeout=None):
+        self.concurrency=max(1,concurrency)
+        self.timeout=timeout
+        self.timeouts=0
+        self.loop=None
+        self.thread=None
+
+    async def score(self,candidate):
+        """
+        Fitness of candidate (higher is better)
+        """
+        raise NotImplementedError("AsyncEvaluator: score() not implemented")
+
+    async def aclose(self):
+        """
+        Releases whatever score() holds (processes, connections)
+        """
+        pass
+
+    def start(self):
+        if self.loop is None:
+            self.loop=asyncio.new_event_loop()
+            self.thread=threading.Thread(target=self.loop.run_forever,daemon=True)
+            self.thread.start()
+        return self.loop
+
+    def run(self,candidates):
+        """
+        Scores candidates, at most concurrency at once,
+        returns their fitnesses in candidates order
+        """
+        future=asyncio.run_coroutine_threadsafe(self.gather(candidates),self.start())
+        return future.result()
+
+    async def gather(self,candidates):
+        gate=asyncio.Semaphore(self.concurrency)
+        async def bounded(pos,candidate):
+            async with gate:
+                return pos,await self.timed(candidate)
+        # results are credited by place as they complete
+        found=[None]*len(candidates)
+        for done in asyncio.as_completed([bounded(pos,c) for (pos,c) in enumerate(candidates)]):
+            pos,fitness=await done
+            found[pos]=fitness
+        return found
+
+    async def timed(self,candidate):
+        try:
+            return await asyncio.wait_for(self.score(candidate),self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts+=1
+            return PartialFitness(float("-inf"))
+
+    def __call__(self,net,budget=None):
+        """
+        Synchronous evaluator protocol: scores the Topology's
+        current weights and state
+        """
+        bar=None
+        if budget is not None:
+            bar=budget.bar
+        return self.run([Candidate(0,net.saveWeights(),net.saveState(),bar)])[0]
+
+    def shutdown(self):
+        """
+        Closes the scorer and stops the event loop thread
+        """
+        if self.loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self.aclose(),self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        self.loop=None
+        self.thread=None
+
+    def __getstate__(self):
+        # the loop, its thread and anything running on it stay
+        # with the original
+        state=dict(self.__dict__)
+        for k in ['loop','thread','process','starting','reader']:
+            if k in state:
+                state[k]=None
+        if 'waiting' in state:
+            state['waiting']={}
+        return state
+
+
+class ProcessScorer(AsyncEvaluator):
+    """
+    Scores candidates with an external process
+
+        command - argument list starting the scorer process
+
+    One process serves every candidate: requests are written as
+    they are submitted and each response is matched to its request
+    by id, so the process may answer in any order.  A response
+    arriving after its candidate timed out is ignored.
+    """
+    def __init__(self,command,**kwargs):
+        super(ProcessScorer,self).__init__(**kwargs)
+        self.command=list(command)
+        self.process=None
+        self.starting=None
+        self.reader=None
+        self.waiting={}
+        self.serial=0
+
+    async def connect(self):
+        # the first candidates in flight share one process start
+        if self.starting is None:
+            self.starting=asyncio.ensure_future(asyncio.create_subprocess_exec(
+                *self.command,stdin=asyncio.subprocess.PIPE,stdout=asyncio.subprocess.PIPE))
+        if self.process is None:
+            process=await asyncio.shield(self.starting)
+            if self.process is None:
+                self.process=process
+                self.reader=asyncio.ensure_future(self.readResponses(process))
+        return self.process
+
+    async def readResponses(self,process):
+        while True:
+            line=await process.stdout.readline()
+            if not line:
+                break
+            reply=json.loads(line)
+            waiter=self.waiting.pop(reply['id'],None)
+            if waiter is not None and not waiter.done():
+                waiter.set_result(float(reply['fitness']))
+        # the scorer went away: fail whatever is still waiting
+        for waiter in self.waiting.values():
+            if not waiter.done():
+                waiter.set_exception(EOFError("ProcessScorer: scorer process exited"))
+        self.waiting.clear()
+
+    async def score(self,candidate):
+        process=await self.connect()
+        self.serial+=1
+        ident=self.serial
+        waiter=asyncio.get_running_loop().create_future()
+        self.waiting[ident]=waiter
+        request={'id':ident,'weights':candidate.weights,'state':candidate.state}
+        process.stdin.write((json.dumps(request)+'\n').encode('utf-8'))
+        try:
+            await process.stdin.drain()
+            return await waiter
+        finally:
+            self.waiting.pop(ident,None)
+
+    async def aclose(self):
+        if self.process is None:
+            return
+        self.process.stdin.close()
+        await self.process.wait()
+        await self.reader
+        self.process=None
+        self.starting=None
+        self.reader=None
+
+
+class AsyncEvaluationPool:
+    """
+    OOPS Executor handing batches of mutants to an AsyncEvaluator
+
+        net      - the trainer's Topology (not used: candidates are
+                   scored from their weight and state snapshots)
+        evalfunc - the trainer's evaluator, an AsyncEvaluator
+
+    Fitnesses come back in mutant order.  The network's state after
+    an external scoring is unknown so every mutant reports its
+    starting state as its final state.
+    """
+    def __init__(self,net,evalfunc):
+        if not isinstance(evalfunc,AsyncEvaluator):
+            raise TypeError("AsyncEvaluationPool: evaluator must be an AsyncEvaluator")
+        self.evalfunc=evalfunc
+        self.workers=evalfunc.concurrency
+
+    def evaluate(self,weights,state,bar=None):
+        """
+        returns list of (fitness,final state) in weights order
+        """
+        candidates=[Candidate(idx,Wts,state,bar) for (idx,Wts) in enumerate(weights)]
+        return [(fitness,state) for fitness in self.evalfunc.run(candidates)]
+
+    def evaluateGrid(self,weights,states,bar=None):
+        """
+        Scores each weight vector from each state, the whole grid
+        out at once (see OOPS.evaluateGrid)
+
+        returns M lists of T (fitness,final state)
+        """
+        T=len(states)
+        candidates=[Candidate(m*T+t,Wts,state,bar)
+                    for (m,Wts) in enumerate(weights) for (t,state) in enumerate(states)]
+        found=self.evalfunc.run(candidates)
+        return [[(found[m*T+t],state) for (t,state) in enumerate(states)]
+                for m in range(len(weights))]
+
+    def submit(self,Wts,state,bar=None):
+        """
+        Starts scoring one weight vector, returns a
+        concurrent.futures.Future of (fitness,final state)
+        """
+        candidate=Candidate(0,Wts,state,bar)
+        async def job():
+            return (await self.evalfunc.timed(candidate),candidate.state)
+        return asyncio.run_coroutine_threadsafe(job(),self.evalfunc.start())
+
+    def close(self):
+        # the evaluator (and its scorer) outlives the pool
+        pass
+
+
+def fakeScore(weights,state):
+    """
+    Fitness the fake scorer gives: closeness of the weights to 0.5
+    """
+    return -math.sqrt(sum((w-0.5)*(w-0.5) for w in weights))
+
+def fakeScorer(argv=None):
+    """
+    Local scorer process speaking the ProcessScorer protocol,
+    answering each request after a random delay (so out of order)
+    """
+    parser=argparse.ArgumentParser(description=fakeScorer.__doc__.strip())
+    parser.add_argument('--fake-scorer',action='store_true')
+    parser.add_argument('--delay',type=float,default=0.05,help='longest answer delay in seconds')
+    parser.add_argument('--drop-every',type=int,default=0,
+                        help='never answer every Nth request (to exercise timeouts)')
+    parser.add_argument('--seed',type=int,default=0)
+    args=parser.parse_args(argv)
+    rng=random.Random(args.seed)
+    lock=threading.Lock()
+    def answer(ident,fitness):
+        with lock:
+            sys.stdout.write(json.dumps({'id':ident,'fitness':fitness})+'\n')
+            sys.stdout.flush()
+    timers=[]
+    for count,line in enumerate(sys.stdin,1):
+        request=json.loads(line)
+        if args.drop_every and count%args.drop_every==0:
+            continue
+        timer=threading.Timer(rng.uniform(0,args.delay),answer,
+                              (request['id'],fakeScore(request['weights'],request['state'])))
+        timer.start()
+        timers.append(timer)
+    for timer in timers:
+        timer.join()
+
+if __name__ == "__main__":
+    if '--fake-scorer' in sys.argv[1:]:
+        fakeScorer()
+    else:
+        print(__doc__)
@@ -0,0 +1,242 @@
+#! /usr/bin/python
+"""
+    Headless performance benchmarks for lstm_oops.
+
+    Builds standard topologies (the 4-node clique of the lstm_oops
+    demo plus hypercubes and random sparse graphs from lstm_builders)
+    and measures as the node and edge counts grow:
+
+        activations_per_sec - Topology.Activate() calls per second
+        sequence_steps_per_sec
+                            - time steps per second run through
+                              Topology.ActivateSequence()
+        evaluations_per_sec - OOPS evaluations per second
+        partial_fraction    - share of an epoch's evaluations stopped
+                              early by their budget
+        batch_evaluations_per_sec
+                            - mutants scored per second through
+                              OOPS.evaluatePopulation()
+        epoch_seconds       - wall time of one TrainingEpoch_Evolve
+        peak_bytes          - peak traced memory of building,
+                              compiling and activating the network
+
+    Results are written as JSON lines, one record per measurement,
+    so runs can be diffed and tracked between releases:
+
+        python lstm_bench.py --quick > bench_output.txt
+
+    Copyright (C) 2013 Christopher BRIAN Jack (gau_veldt@hotmail.com)
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from functools import partial
+
+from lstm_oops import Topology,LSTM_Node,Input,OOPS
+from lstm_builders import hypercube,randomSparse
+
+try:
+    import numpy
+    from lstm_engine import NumpyEngine
+except ImportError:
+    numpy=None
+
+gates=LSTM_Node.iConns
+
+def clique4():
+    """
+    The 4-node demo network from lstm_oops' __main__
+    (returns Topology, input terminals, output terminals)
+    """
+    net=Topology()
+    nodes={idx:LSTM_Node() for idx in "ABCD"}
+    for n in nodes.values():
+        for g in gates[1:]:
+            net.Connect((n,'peephole'),(n,g))
+    for a in "ABCD":
+        for b in "ABCD":
+            if a!=b:
+                for g in gates:
+                    net.Connect((nodes[a],"output"),(nodes[b],g))
+    outputs=[net.Connect((nodes['D'],"output"),None)]
+    inputs=[]
+    for idx in range(3):
+        term=net.Connect(None,(nodes['A'],"input"))
+        for dst in "BCD":
+            net.Connect((term,Input),(nodes[dst],"input"))
+        inputs.append(term)
+    return net,inputs,outputs
+
+
+class SequenceFitness:
+    """
+    Negated squared error of the outputs over a fixed input sequence
+
+    Uses only elementwise arithmetic so the same evaluator scores a
+    single network or a population (batched) of networks.  Stops
+    early once its Budget (see lstm_oops.Budget) is exhausted.
+    """
+    def __init__(self,inputs,outputs,length=10,seed=0):
+        rng=random.Random(seed)
+        self.inputs=inputs
+        self.outputs=outputs
+        self.frames=[[rng.uniform(-1,1) for t in inputs] for i in range(length)]
+        self.targets=[[rng.uniform(0,1) for t in outputs] for i in range(length)]
+
+    def __call__(self,net,budget=None):
+        err=0.0
+        for frame,target in zip(self.frames,self.targets):
+            for term,val in zip(self.inputs,frame):
+                term.write(val)
+            net.Activate()
+            for term,val in zip(self.outputs,target):
+                delta=term.read()-val
+                err=err+delta*delta
+            if budget is not None and budget.exhausted(-err):
+                break
+        return -err
+
+
+def rate(func,minTime):
+    """
+    Calls func until minTime seconds pass, returns calls per second
+    """
+    count=0
+    began=time.perf_counter()
+    elapsed=0.0
+    while elapsed<minTime or count==0:
+        func()
+        count+=1
+        elapsed=time.perf_counter()-began
+    return count/elapsed
+
+def engines(args):
+    found=[('node',None)]
+    if numpy is not None:
+        found.append(('dense',partial(NumpyEngine,precision=args.precision)))
+        found.append(('sparse',partial(NumpyEngine,layout='sparse',precision=args.precision)))
+    return found
+
+def cases(args):
+    yield ('clique-4',clique4)
+    store=args.store=='sparse'
+    for dim in range(3,args.max_dim+1):
+        yield ('hypercube-%s' % dim,partial(hypercube,dim,sparse=store))
+    for count in args.sparse:
+        yield ('sparse-%s' % count,partial(randomSparse,count,args.fan_in,sparse=store))
+
+def peakBytes(builder,args):
+    """
+    Peak traced memory of building the network, compiling it for
+    every engine and activating it once
+
+    A pass of its own: tracing slows every allocation so nothing
+    is timed while it is on.
+    """
+    tracemalloc.start()
+    try:
+        net,inputs,outputs=builder()
+        for engineName,engine in engines(args):
+            net.enableEngine(engine)
+            net.Activate()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def measure(name,builder,args,emit):
+    peak=peakBytes(builder,args)
+    began=time.perf_counter()
+    net,inputs,outputs=builder()
+    built=time.perf_counter()-began
+    info={'case':name,'nodes':len(net.nodeRefs),'edges':len(net.connections)}
+    emit(info,'build_seconds',built)
+    emit(info,'peak_bytes',peak)
+    evaluate=SequenceFitness(inputs,outputs,args.length)
+    for engineName,engine in engines(args):
+        net.enableEngine(engine)
+        net.Activate()
+        emit(dict(info,engine=engineName),'activations_per_sec',
+             rate(net.Activate,args.min_time))
+        emit(dict(info,engine=engineName),'sequence_steps_per_sec',
+             args.length*rate(partial(net.ActivateSequence,evaluate.frames,inputs,outputs),args.min_time))
+
+    for engineName,engine in engines(args):
+        net.enableEngine(engine)
+        kwargs={'Topology':net,'Evaluator':evaluate,'seed':1,
+                'mutantCount':args.mutants,'maxSolutions':args.solutions,
+                'precision':args.precision}
+        if engine is not None:
+            kwargs['batchSize']=args.batch
+        trainer=OOPS(**kwargs)
+        tag=dict(info,engine=engineName)
+        emit(tag,'evaluations_per_sec',
+             rate(partial(trainer.evaluator,net),args.min_time))
+        if engine is not None:
+            mutants=[trainer.saveWeights()]*args.batch
+            emit(tag,'batch_evaluations_per_sec',
+                 args.batch*rate(partial(trainer.evaluatePopulation,mutants),args.min_time))
+        if info['edges']<=args.epoch_max_edges:
+            began=time.perf_counter()
+            trainer.TrainingEpoch_Evolve()
+            emit(tag,'epoch_seconds',time.perf_counter()-began)
+            emit(tag,'partial_fraction',trainer.partialEvaluations/float(args.mutants))
+
+def main(argv=None):
+    parser=argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--quick',action='store_true',help='small sizes and short timings')
+    parser.add_argument('--max-dim',type=int,default=8,help='largest hypercube dimension (default 8)')
+    parser.add_argument('--sparse',type=int,nargs='*',default=[64,256,1024],
+                        help='random sparse graph node counts')
+    parser.add_argument('--fan-in',type=int,default=8,help='edges into each sparse graph node')
+    parser.add_argument('--store',choices=['dict','sparse'],default='dict',
+                        help='connection store of the built networks (default dict)')
+    parser.add_argument('--precision',choices=['float64','float32'],default='float64',
+                        help='engine and solution store precision (default float64)')
+    parser.add_argument('--length',type=int,default=10,help='evaluation sequence length')
+    parser.add_argument('--mutants',type=int,default=100,help='mutants per timed epoch')
+    parser.add_argument('--solutions',type=int,default=100,help='solution store size')
+    parser.add_argument('--batch',type=int,default=50,help='population batch size')
+    parser.add_argument('--epoch-max-edges',type=int,default=5000,
+                        help='skip epoch timing above this edge count')
+    parser.add_argument('--min-time',type=float,default=0.5,help='seconds per rate measurement')
+    parser.add_argument('--output',default='-',help='JSON lines output file (default stdout)')
+    args=parser.parse_args(argv)
+    if args.quick:
+        args.max_dim=min(args.max_dim,5)
+        args.sparse=[n for n in args.sparse if n<=64]
+        args.mutants=min(args.mutants,20)
+        args.min_time=min(args.min_time,0.1)
+
+    out=sys.stdout if args.output=='-' else open(args.output,'w')
+    def emit(tags,metric,value):
+        out.write(json.dumps(dict(tags,metric=metric,value=value),sort_keys=True)+'\n')
+        out.flush()
+    emit({'python':platform.python_version(),
+          'numpy':numpy.__version__ if numpy is not None else None},'meta',
+         vars(args))
+    try:
+        for name,builder in cases(args):
+            measure(name,builder,args,emit)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+#! /usr/bin/python
+"""
+    Topology builders for LSTM networks.
+
+    Each builder wires LSTM_Nodes the way the OOPS docstring
+    recommends and returns (Topology, input terminals, output
+    terminals):
+
+        - every node's peephole feeds its own input, forget and
+          output gates
+        - a node's output feeds all four gates of its neighbours
+        - input terminals cross onto all gates of every input node
+        - output terminals cross from the outputs of every output
+          node
+
+    Builders differ only in who neighbours whom:
+
+        hypercube(dim)        - vertices of a dim-cube, neighbours
+                                one axis apart
+        fullyConnected(count) - every node neighbours every other
+        layered(sizes)        - each layer feeds the next (and
+                                optionally itself)
+        randomSparse(count,fanIn)
+                              - fanIn random edges into each node
+
+    All connections are made with one Topology.ConnectBulk() call.
+    Keyword options common to all builders:
+
+        inputs      - input terminal count (default 1)
+        outputs     - output terminal count (default 1)
+        inputNodes  - indices of the nodes the inputs cross onto
+        outputNodes - indices of the nodes the outputs cross from
+        sparse      - passed to Topology (SparseConnections store)
+
+        from lstm_builders import hypercube
+        net,inputs,outputs=hypercube(10,sparse=True)
+
+    Copyright (C) 2013 Christopher BRIAN Jack (gau_veldt@hotmail.com)
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import random
+
+from lstm_oops import Topology,LSTM_Node,Input,Output,TopologyError
+
+gates=LSTM_Node.iConns
+
+def selfPeepholes(nodes):
+    """
+    Edges from each node's peephole to its own gates
+    """
+    for n in nodes:
+        for g in gates[1:]:
+            yield ((n,'peephole'),(n,g))
+
+def neighbourGates(src,dests):
+    """
+    Edges from src's output to all gates of each of dests
+    """
+    for dest in dests:
+        for g in gates:
+            yield ((src,'output'),(dest,g))
+
+def build(nodes,edges,**kwargs):
+    """
+    Makes the Topology: self peepholes, then edges, then the
+    input and output terminal crossings
+    """
+    inputNodes=kwargs.get('inputNodes',[0])
+    outputNodes=kwargs.get('outputNodes',[len(nodes)-1])
+    for idx in list(inputNodes)+list(outputNodes):
+        if not -len(nodes)<=idx<len(nodes):
+            raise TopologyError("build: no node %s in a %s node network" % (idx,len(nodes)))
+    inputs=[Input() for i in range(kwargs.get('inputs',1))]
+    outputs=[Output() for i in range(kwargs.get('outputs',1))]
+    wiring=list(selfPeepholes(nodes))
+    wiring.extend(edges)
+    for term in inputs:
+        for idx in inputNodes:
+            for g in gates:
+                wiring.append(((term,Input),(nodes[idx],g)))
+    for term in outputs:
+        for idx in outputNodes:
+            wiring.append(((nodes[idx],'output'),(term,Output)))
+    net=Topology(sparse=kwargs.get('sparse',False))
+    net.ConnectBulk(wiring)
+    return net,inputs,outputs
+
+def hypercube(dim,**kwargs):
+    """
+    2^dim nodes on the vertices of a hypercube, each feeding its
+    dim neighbours.  Inputs cross onto vertex 0 and outputs from
+    the opposite vertex unless told otherwise.
+    """
+    nodes=[LSTM_Node() for i in range(2**dim)]
+    edges=[]
+    for v,n in enumerate(nodes):
+        edges.extend(neighbourGates(n,[nodes[v^(1<<axis)] for axis in range(dim)]))
+    return build(nodes,edges,**kwargs)
+
+def fullyConnected(count,**kwargs):
+    """
+    count nodes each feeding every other node
+    """
+    nodes=[LSTM_Node() for i in range(count)]
+    edges=[]
+    for n in nodes:
+        edges.extend(neighbourGates(n,[m for m in nodes if m is not n]))
+    return build(nodes,edges,**kwargs)
+
+def layered(sizes,**kwargs):
+    """
+    Layers of sizes[k] nodes, every node of a layer feeding every
+    node of the next.  Inputs cross onto the whole first layer and
+    outputs from the whole last layer by default.
+
+        recurrent - also connect the nodes within each layer
+                    (default False)
+    """
+    layers=[[LSTM_Node() for i in range(size)] for size in sizes]
+    if not layers or min(sizes)<1:
+        raise TopologyError("layered: every layer needs a node")
+    nodes=[n for layer in layers for n in layer]
+    edges=[]
+    for lower,upper in zip(layers[:-1],layers[1:]):
+        for n in lower:
+            edges.extend(neighbourGates(n,upper))
+    if kwargs.get('recurrent',False):
+        for layer in layers:
+            for n in layer:
+                edges.extend(neighbourGates(n,[m for m in layer if m is not n]))
+    kwargs.setdefault('inputNodes',range(len(layers[0])))
+    kwargs.setdefault('outputNodes',range(len(nodes)-len(layers[-1]),len(nodes)))
+    return build(nodes,edges,**kwargs)
+
+def randomSparse(count,fanIn,seed=0,**kwargs):
+    """
+    count nodes each receiving fanIn edges from a random node's
+    output or peephole onto a random gate (seeded)
+    """
+    rng=random.Random(seed)
+    nodes=[LSTM_Node() for i in range(count)]
+    edges=[]
+    for n in nodes:
+        for k in range(fanIn):
+            src=rng.choice(nodes)
+            edges.append(((src,rng.choice(LSTM_Node.oConns)),(n,rng.choice(gates))))
+    return build(nodes,edges,**kwargs)
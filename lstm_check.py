@@ -0,0 +1,354 @@
+#! /usr/bin/python
+"""
+    Correctness checks for lstm_oops and its optional modules.
+
+    Each check rebuilds a small case and compares the fast path
+    against the reference it must reproduce:
+
+        engine   - NumpyEngine (dense and sparse, single network
+                   and population) against the per-node path
+        gradient - NumpyEngine.gradient() against central
+                   differences of the squared output error
+        affect   - OOPS.updateAffect (single, batched and without
+                   numpy) against the original per-weight update
+        resume   - a run resumed from a checkpoint against the
+                   same run left uninterrupted
+        async    - training against lstm_async's fake scorer
+                   dropping requests: timed out candidates must not
+                   poison the weight affects
+
+    Prints one line per check and exits non-zero when any fails:
+
+        python lstm_check.py
+        python lstm_check.py engine gradient
+
+    Copyright (C) 2013 Christopher BRIAN Jack (gau_veldt@hotmail.com)
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import tempfile
+from functools import partial
+
+import lstm_oops
+from lstm_oops import OOPS
+from lstm_bench import clique4,SequenceFitness
+from lstm_builders import hypercube,randomSparse,layered
+
+try:
+    import numpy
+    from lstm_engine import NumpyEngine
+except ImportError:
+    numpy=None
+
+class CheckError(Exception):
+    """ When a result strays from its reference """
+    def __init__(self,val):
+        self.value=val
+    def __str__(self):
+        return self.value
+
+
+def expect(ok,msg,*args):
+    if not ok:
+        raise CheckError(msg % args)
+
+def networks():
+    """
+    (name,builder) of the small networks checked
+    """
+    yield ('clique-4',clique4)
+    yield ('hypercube-3',partial(hypercube,3,inputs=2,outputs=2))
+    yield ('sparse-12',partial(randomSparse,12,4,inputs=2,outputs=2))
+    yield ('layered',partial(layered,[2,3,2],recurrent=True,inputs=2,outputs=2))
+
+def randomize(net,rng):
+    net.loadWeights([rng.uniform(-2,2) for w in range(len(net.connections))])
+    net.loadState([rng.uniform(-1,1) for s in range(len(net.saveState()))])
+
+def checkEngine(tol=1e-13,steps=30):
+    """
+    Engine outputs and states against the per-node path
+    """
+    worst=0.0
+    for name,builder in networks():
+        net,inputs,outputs=builder()
+        randomize(net,random.Random(1))
+        W,start=net.saveWeights(),net.saveState()
+        frames=[[random.Random(t).uniform(-1,1) for i in inputs] for t in range(steps)]
+        runs={}
+        for layout in [None,'dense','sparse']:
+            net.enableEngine(None if layout is None else partial(NumpyEngine,layout=layout))
+            net.loadWeights(W)
+            net.loadState(start)
+            found=[]
+            for t,frame in enumerate(frames):
+                for term,val in zip(inputs,frame):
+                    term.write(val)
+                if t==steps//2:
+                    # weights changed mid-run must reach the engine
+                    net.loadWeights([w*0.9 for w in W])
+                net.Activate()
+                found.append([o.read() for o in outputs]+net.saveState())
+            runs[layout]=numpy.array(found)
+            if layout is not None:
+                # a population of copies runs as the single network
+                net.loadWeights(W)
+                net.loadState(start)
+                engine=net.compileEngine()
+                engine.loadPopulation([W]*3)
+                seq=engine.runSequence(frames,inputs,outputs)
+                engine.dropPopulation()
+                net.loadState(start)
+                one=numpy.array(net.ActivateSequence(frames,inputs,outputs)[0])
+                worst=max(worst,float(numpy.abs(seq-one[:,numpy.newaxis,:]).max()))
+        for layout in ['dense','sparse']:
+            gap=float(numpy.abs(runs[layout]-runs[None]).max())
+            expect(gap<=tol,"engine: %s %s differs from the per-node path by %g",name,layout,gap)
+            worst=max(worst,gap)
+        net.enableEngine(None)
+    expect(worst<=tol,"engine: population differs from a single network by %g",worst)
+    return "largest difference %g" % worst
+
+def checkGradient(tol=1e-8,frames=5,h=1e-6):
+    """
+    NumpyEngine.gradient() against central differences of its
+    own error
+    """
+    worst=0.0
+    for name,builder in networks():
+        net,inputs,outputs=builder()
+        rng=numpy.random.default_rng(1)
+        net.loadWeights(rng.uniform(-1,1,len(net.connections)))
+        start=rng.uniform(-1,1,len(net.saveState())).tolist()
+        X=rng.uniform(-1,1,(frames,len(inputs)))
+        Y=rng.uniform(0,1,(frames,len(outputs)))
+        for layout in ['dense','sparse']:
+            net.loadState(start)
+            engine=NumpyEngine(net,layout=layout)
+            error,grad=engine.gradient(X,Y,inputs,outputs)
+            # the error is the per-node path's squared error
+            net.loadState(start)
+            found=numpy.array(net.ActivateSequence(X.tolist(),inputs,outputs)[0])
+            gap=abs(float(((found-Y)**2).sum())-error)
+            expect(gap<=1e-12,"gradient: %s %s error differs by %g",name,layout,gap)
+            W=net.saveWeights()
+            numeric=numpy.zeros(len(W))
+            for e in range(len(W)):
+                for sign in [1,-1]:
+                    moved=list(W)
+                    moved[e]+=sign*h
+                    net.loadWeights(moved)
+                    net.loadState(start)
+                    numeric[e]+=sign*engine.gradient(X,Y,inputs,outputs)[0]/(2*h)
+            net.loadWeights(W)
+            gap=float(numpy.abs(numeric-grad).max())
+            expect(gap<=tol,"gradient: %s %s differs from central differences by %g",name,layout,gap)
+            worst=max(worst,gap)
+    return "largest difference %g" % worst
+
+def referenceAffect(affect,priorWts,currentWts,netFitness,fScale):
+    """
+    The original updateAffect: one update of the list affect
+    then renormalizing it in full
+    """
+    if fScale==0.0:
+        fScale=float("Inf")
+    mags=[math.fabs(c-p) for (c,p) in zip(currentWts,priorWts)]
+    scale=max(mags)-min(mags)
+    if scale==0.0:
+        scale=float("Inf")
+    minAff=0
+    maxAff=0
+    for idx in range(len(affect)):
+        affect[idx]=affect[idx]+(mags[idx]/scale)*(netFitness/fScale)
+        minAff=min(minAff,affect[idx])
+        maxAff=max(maxAff,affect[idx])
+    scale=maxAff-minAff
+    if scale==0.0:
+        scale=float("Inf")
+    for idx in range(len(affect)):
+        affect[idx]=(affect[idx]-minAff)/scale
+
+def affectCases(count,weights,seed):
+    """
+    count random (prior,current,fitness change,fitness range)
+    updates, including ones changing no weight or no fitness
+    """
+    rng=random.Random(seed)
+    for k in range(count):
+        prior=[rng.uniform(-2,2) for w in range(weights)]
+        current=[p if rng.random()<0.3 else rng.uniform(-2,2) for p in prior]
+        if k%7==0:
+            current=list(prior)
+        change=rng.choice([0.0,rng.uniform(-1,1),rng.uniform(0,3)])
+        fScale=0.0 if k%5==0 else rng.uniform(0,3)
+        yield prior,current,change,fScale
+
+def checkAffect(tol=1e-12,count=2000):
+    """
+    The affects the mutator sees against the original update
+    """
+    net,inputs,outputs=clique4()
+    E=len(net.connections)
+    worst=0.0
+    for label in ['numpy','list']:
+        saved=lstm_oops.numpy
+        if label=='list':
+            lstm_oops.numpy=None
+        try:
+            trainer=OOPS(Topology=net,Evaluator=lambda n:0.0,seed=1)
+            reference=[1.0]*E
+            for prior,current,change,fScale in affectCases(count,E,3):
+                trainer.updateAffect(prior,current,change,fScale)
+                referenceAffect(reference,prior,current,change,fScale)
+                gap=max(abs(a-b) for (a,b) in zip(trainer.affects(),reference))
+                expect(gap<=tol,"affect: %s path differs from the original by %g",label,gap)
+                worst=max(worst,gap)
+        finally:
+            lstm_oops.numpy=saved
+    # a batch is its updates made one call at a time
+    cases=list(affectCases(200,E,4))
+    batched=OOPS(Topology=net,Evaluator=lambda n:0.0,seed=1)
+    single=OOPS(Topology=net,Evaluator=lambda n:0.0,seed=1)
+    batched.updateAffect([c[0] for c in cases],[c[1] for c in cases],
+                         [c[2] for c in cases],[c[3] for c in cases])
+    for prior,current,change,fScale in cases:
+        single.updateAffect(prior,current,change,fScale)
+    expect(list(batched.affects())==list(single.affects()),"affect: batched update differs from single updates")
+    return "largest difference %g" % worst
+
+def scalarFitness(evaluate,net,budget=None):
+    """
+    evaluate(net) as a float, like the lstm_oops demo's Tester:
+    it cannot score a population
+    """
+    return float(evaluate(net,budget))
+
+def checkResume(epochs=3,before=4):
+    """
+    Resumes runs (numpy and random.Random generators, scalar with
+    and without an engine, batched) from a checkpoint and compares
+    them to the runs left uninterrupted
+    """
+    def make(rng,batch,engine):
+        net,inputs,outputs=hypercube(3)
+        evaluate=SequenceFitness(inputs,outputs,6)
+        if engine:
+            net.enableEngine(NumpyEngine)
+            if batch==1:
+                evaluate=partial(scalarFitness,evaluate)
+        return OOPS(Topology=net,Evaluator=evaluate,Random=rng,
+                    mutantCount=30,maxSolutions=20,batchSize=batch,timeTravel=2)
+    folder=tempfile.mkdtemp()
+    try:
+        for label,generator in [('numpy',numpy.random.default_rng),('random',random.Random)]:
+            for batch,engine in [(1,False),(1,True),(8,True)]:
+                path=os.path.join(folder,'%s-%s-%s.ckpt' % (label,batch,engine))
+                whole=make(generator(5),batch,engine)
+                for k in range(before):
+                    whole.TrainingEpoch_Evolve()
+                whole.saveCheckpoint(path)
+                for k in range(epochs):
+                    whole.TrainingEpoch_Evolve()
+                resumed=make(generator(99),batch,engine)
+                resumed.loadCheckpoint(path)
+                for k in range(epochs):
+                    resumed.TrainingEpoch_Evolve()
+                case="%s generator, batchSize %s%s" % (label,batch,", engine" if engine else "")
+                expect(whole.rank==resumed.rank,"resume: %s rank %r, uninterrupted %r",
+                       case,resumed.rank,whole.rank)
+                expect(whole.solutions.keys==resumed.solutions.keys and
+                       list(whole.solutions.weights)==list(resumed.solutions.weights),
+                       "resume: %s solution store differs",case)
+                expect(list(whole.affects())==list(resumed.affects()),"resume: %s affects differ",case)
+                expect(list(whole.net.state)==list(resumed.net.state),"resume: %s state differs",case)
+    finally:
+        for name in os.listdir(folder):
+            os.remove(os.path.join(folder,name))
+        os.rmdir(folder)
+    return "exact"
+
+def checkAsync(epochs=3,dropEvery=25,timeout=0.3):
+    """
+    Trains through a ProcessScorer (serially and through an
+    AsyncEvaluationPool) whose scorer never answers every
+    dropEvery-th request
+    """
+    from lstm_async import Candidate,ProcessScorer,AsyncEvaluationPool
+    command=[sys.executable,os.path.join(os.path.dirname(os.path.abspath(__file__)),'lstm_async.py'),
+             '--fake-scorer','--delay','0.005','--drop-every',str(dropEvery)]
+    timeouts=0
+    for label,kwargs in [('serial',{}),('pool',{'Executor':AsyncEvaluationPool,'batchSize':20})]:
+        net,inputs,outputs=clique4()
+        scorer=ProcessScorer(command,concurrency=8,timeout=timeout)
+        try:
+            # started before timing begins
+            scorer.timeout=None
+            scorer.run([Candidate(0,net.saveWeights(),net.saveState())])
+            scorer.timeout=timeout
+            trainer=OOPS(Topology=net,Evaluator=scorer,seed=2,mutantCount=40,**kwargs)
+            for k in range(epochs):
+                trainer.TrainingEpoch_Evolve()
+        finally:
+            scorer.shutdown()
+        expect(scorer.timeouts>0,"async: %s run saw no timeouts",label)
+        expect(trainer.partialEvaluations>=scorer.timeouts,
+               "async: %s run counted %s of %s timeouts as partial",
+               label,trainer.partialEvaluations,scorer.timeouts)
+        affects=list(trainer.affects())
+        expect(all(math.isfinite(a) for a in affects),"async: %s affects are not finite",label)
+        expect(not trainer.affectInit and affects!=[1.0]*len(affects),"async: %s affects never updated",label)
+        expect(math.isfinite(trainer.minFitness) and math.isfinite(trainer.maxFitness),
+               "async: %s fitness range is not finite",label)
+        expect(all(math.isfinite(w) for w in trainer.solutions.weights),
+               "async: %s stored weights are not finite",label)
+        timeouts+=scorer.timeouts
+    return "%s timeouts" % timeouts
+
+checks={
+    'engine':checkEngine,
+    'gradient':checkGradient,
+    'affect':checkAffect,
+    'resume':checkResume,
+    'async':checkAsync,
+    }
+
+def main(argv=None):
+    parser=argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('names',nargs='*',help='checks to run: %s (default all)' % ', '.join(checks))
+    args=parser.parse_args(argv)
+    for name in args.names:
+        if name not in checks:
+            parser.error("unknown check '%s'" % name)
+    if numpy is None:
+        print("lstm_check: numpy is required")
+        return 2
+    failed=0
+    for name in args.names or list(checks):
+        try:
+            found=checks[name]()
+        except CheckError as err:
+            failed+=1
+            print("FAIL %s" % err)
+        else:
+            print("ok   %s (%s)" % (name,found))
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
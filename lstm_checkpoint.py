@@ -0,0 +1,261 @@
+#! /usr/bin/python
+"""
+    Checkpoint files for the OOPS trainer.
+
+    A checkpoint holds everything TrainingEpoch_Evolve depends on so
+    a killed run resumes exactly where it stopped: the solution
+    store, weight affects, rank, fitness range, epoch and solve
+    counters, the random generators' positions and the Topology's
+    weights and node states.
+
+    Layout (little header, contiguous arrays):
+
+        magic       8 bytes  b'LSTMOOPS'
+        version     uint32
+        header size uint32
+        header      JSON: scalars, generator states and the
+                    (name,typecode,offset,count) of each array
+        arrays      raw machine values, each starting on an 8 byte
+                    boundary (offsets count from the end of the
+                    padded header) so they can be memory mapped
+
+    Writes go to a temporary file that replaces the checkpoint only
+    once complete so a crash never leaves a torn checkpoint.
+
+        Trainer.saveCheckpoint("run.ckpt")
+        Trainer=OOPS(Topology=net,Evaluator=Tester)
+        Trainer.loadCheckpoint("run.ckpt")
+
+    or let the trainer write one every few epochs:
+
+        Trainer=OOPS(Topology=net,Evaluator=Tester,
+                     checkpoint="run.ckpt",checkpointEvery=10)
+
+    Copyright (C) 2013 Christopher BRIAN Jack (gau_veldt@hotmail.com)
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import json
+import os
+import struct
+from array import array
+
+from lstm_oops import SolutionStore,doubles
+
+try:
+    import numpy
+except ImportError:
+    numpy=None
+
+MAGIC=b'LSTMOOPS'
+VERSION=2
+
+class CheckpointError(Exception):
+    """ When a checkpoint cannot be read or does not fit """
+    def __init__(self,val):
+        self.value=val
+    def __str__(self):
+        return self.value
+
+
+def entropyState(rng):
+    """
+    JSON-able position of a random generator (None when it has
+    none, eg: random.SystemRandom)
+    """
+    if rng is None:
+        return None
+    if numpy is not None and isinstance(rng,numpy.random.Generator):
+        return {'kind':'numpy','state':rng.bit_generator.state}
+    try:
+        return {'kind':'random','state':rng.getstate()}
+    except (AttributeError,NotImplementedError):
+        return None
+
+def restoreEntropy(rng,saved):
+    if saved is None or rng is None:
+        return
+    if saved['kind']=='numpy':
+        if numpy is None or not isinstance(rng,numpy.random.Generator):
+            raise CheckpointError("checkpoint: saved with a numpy generator")
+        rng.bit_generator.state=saved['state']
+        return
+    version,internal,gauss=saved['state']
+    rng.setstate((version,tuple(internal),gauss))
+
+def pad(count):
+    return (-count)%8
+
+def save(trainer,path):
+    """
+    Writes trainer's state to path atomically
+    """
+    store=trainer.solutions
+    net=trainer.net
+    arrays=[
+        ('storeWeights',store.weights),
+        ('storeStates',store.states),
+        ('stateOf',store.stateOf),
+        ('stateRefs',store.stateRefs),
+        ('stateFree',array('q',store.stateFree)),
+        ('keyFitness',array('d',[-key[0] for (key,row) in store.keys])),
+        ('keySerial',array('q',[-key[1] for (key,row) in store.keys])),
+        ('keyRow',array('q',[row for (key,row) in store.keys])),
+        ('freeRows',array('q',store.free)),
+        ('weightAffect',doubles(trainer.rawAffect)),
+        ('netWeights',net.connections.weights),
+        ('netState',net.state),
+        ]
+    offset=0
+    specs=[]
+    for name,values in arrays:
+        specs.append((name,values.typecode,offset,len(values)))
+        offset+=len(values)*values.itemsize
+        offset+=pad(offset)
+    header={
+        'capacity':store.capacity,
+        'weightCount':store.weightCount,
+        'stateCount':store.stateCount,
+        'precision':store.precision,
+        'serial':store.serial,
+        'rank':trainer.rank,
+        'minFitness':trainer.minFitness,
+        'maxFitness':trainer.maxFitness,
+        'currentSolves':trainer.currentSolves,
+        'partialEvaluations':trainer.partialEvaluations,
+        'epochs':trainer.epochs,
+        'stepScale':trainer.stepScale,
+        'steadyAlternate':trainer.steadyAlternate,
+        'affectInit':trainer.affectInit,
+        'affectRange':list(trainer.affectRange),
+        'affectOffset':trainer.affectOffset,
+        'affectScale':trainer.affectScale,
+        'entropy':entropyState(trainer.entropy),
+        'batchEntropy':entropyState(trainer.batchEntropy),
+        'arrays':specs,
+        }
+    blob=json.dumps(header).encode('utf-8')
+    tmp=path+'.tmp'
+    with open(tmp,'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<II',VERSION,len(blob)))
+        f.write(blob)
+        f.write(bytes(pad(len(MAGIC)+8+len(blob))))
+        for name,values in arrays:
+            values.tofile(f)
+            f.write(bytes(pad(len(values)*values.itemsize)))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp,path)
+
+def readHeader(f):
+    if f.read(len(MAGIC))!=MAGIC:
+        raise CheckpointError("checkpoint: not a checkpoint file")
+    version,size=struct.unpack('<II',f.read(8))
+    if not 1<=version<=VERSION:
+        raise CheckpointError("checkpoint: unsupported version %s" % version)
+    header=json.loads(f.read(size).decode('utf-8'))
+    header['version']=version
+    start=len(MAGIC)+8+size
+    return header,start+pad(start)
+
+def load(trainer,path):
+    """
+    Restores trainer's state from a checkpoint made by save()
+
+    The trainer must have been created for a Topology with the
+    same connections and nodes as the one checkpointed.
+    """
+    with open(path,'rb') as f:
+        header,base=readHeader(f)
+        found={}
+        for name,typecode,offset,count in header['arrays']:
+            f.seek(base+offset)
+            values=array(typecode)
+            try:
+                values.fromfile(f,count)
+            except EOFError:
+                raise CheckpointError("checkpoint: %s is truncated" % path)
+            found[name]=values
+    net=trainer.net
+    if (len(found['netWeights'])!=len(net.connections.weights) or
+        len(found['netState'])!=len(net.state)):
+        raise CheckpointError("checkpoint: saved for a different Topology")
+
+    store=SolutionStore(header['capacity'],header['weightCount'],header['stateCount'],
+                        header.get('precision','float64'))
+    store.weights[:]=found['storeWeights']
+    store.keys=[((-fitness,-serial),row) for (fitness,serial,row) in zip(
+        found['keyFitness'],found['keySerial'],found['keyRow'])]
+    store.free=found['freeRows'].tolist()
+    store.serial=header['serial']
+    if header['version']>=2:
+        store.states=found['storeStates']
+        store.stateOf=found['stateOf']
+        store.stateRefs=found['stateRefs']
+        store.stateFree=found['stateFree'].tolist()
+        store.reindexStates()
+    else:
+        # version 1 kept a state row per solution row
+        S=store.stateCount
+        states=found['storeStates']
+        for key,row in store.keys:
+            store.stateOf[row]=store.intern(states[row*S:(row+1)*S])
+    trainer.solutions=store
+    trainer.precision=store.precision
+    trainer.maxSolutions=store.capacity
+
+    # saved under its old name: older checkpoints hold the
+    # affects normalized, as an offset of 0 and scale of 1 reads
+    trainer.rawAffect=found['weightAffect']
+    trainer.affectRange=tuple(header['affectRange'])
+    trainer.affectOffset=header.get('affectOffset',0.0)
+    trainer.affectScale=header.get('affectScale',1.0)
+    trainer.affectInit=header['affectInit']
+    trainer.rank=header['rank']
+    trainer.minFitness=header['minFitness']
+    trainer.maxFitness=header['maxFitness']
+    trainer.currentSolves=header['currentSolves']
+    trainer.partialEvaluations=header['partialEvaluations']
+    trainer.epochs=header['epochs']
+    trainer.stepScale=header.get('stepScale',1.0)
+    trainer.steadyAlternate=header.get('steadyAlternate',0)
+    # steady state evaluations out at save time are not resumed
+    trainer.inFlight=[]
+    restoreEntropy(trainer.entropy,header['entropy'])
+    trainer.batchEntropy=None
+    if header['batchEntropy'] is not None:
+        if numpy is None:
+            raise CheckpointError("checkpoint: saved with a numpy generator")
+        trainer.batchEntropy=numpy.random.default_rng()
+        restoreEntropy(trainer.batchEntropy,header['batchEntropy'])
+    if trainer.cache is not None:
+        trainer.cache.clear()
+
+    net.compiled=None
+    net.connections.weights[:]=found['netWeights']
+    net.state[:]=found['netState']
+
+def mapped(path):
+    """
+    (header,{name:array}) with the arrays memory mapped read-only
+    (numpy.memmap), eg: to inspect a large store without loading it
+    """
+    with open(path,'rb') as f:
+        header,base=readHeader(f)
+    views={}
+    for name,typecode,offset,count in header['arrays']:
+        views[name]=numpy.memmap(path,dtype=numpy.dtype(typecode),mode='r',
+                                 offset=base+offset,shape=(count,))
+    return header,views
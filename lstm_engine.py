@@ -0,0 +1,623 @@
+#! /usr/bin/python
+"""
+    Vectorized activation engine for LSTM_Node Topologies.
+
+    The engine compiles a Topology made of LSTM_Nodes into weight
+    matrices (one block per gate channel) and state vectors so that
+    a network activation is a handful of matrix-vector products and
+    elementwise sigmoids instead of per-node dictionary traffic.
+
+    Requires numpy.  Select it per Topology with:
+
+        from lstm_engine import NumpyEngine
+        net.enableEngine(NumpyEngine)
+        net.enableEngine(partial(NumpyEngine,layout='sparse'))
+
+    Copyright (C) 2013 Christopher BRIAN Jack (gau_veldt@hotmail.com)
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import numpy
+
+from lstm_oops import Input,Output,LSTM_Node,TopologyError
+
+# gate channel column within a node's block of pre-activations
+gateIndex={ch:idx for (idx,ch) in enumerate(LSTM_Node.iConns)}
+
+def sigmoid(x):
+    """
+    Elementwise sigmoid function
+    """
+    with numpy.errstate(over='ignore'):
+        return logistic(x)
+
+def logistic(x):
+    """
+    sigmoid() for callers already ignoring overflow
+    """
+    return 1.0/(1.0+numpy.exp(-x))
+
+
+class NumpyEngine:
+    """
+    Compiled form of a Topology of LSTM_Nodes
+
+    The per-node path activates nodes one at a time, in
+    Topology.activationOrder(), so a node sees the *fresh* output
+    and peephole of every node activated before it and the *stale*
+    (previous step) values of itself and every node after it.  The
+    output gate is the exception: it sees its own fresh peephole.
+    To reproduce this exactly each edge is classified when
+    compiling:
+
+        stale - source is the sink node itself, a later node or an
+                input terminal; summed once per step before any
+                node changes state
+        fresh - source is an earlier node; summed per level
+        self  - a node's own peephole feeding its output gate
+
+    Nodes are grouped into levels where a node's level is one past
+    the highest level of any earlier node feeding it.  Nodes within
+    a level do not see each other's fresh values so a level is
+    activated as a single vector operation.
+
+    Internally nodes are renumbered level by level and the state
+    of K networks is held as arrays:
+
+        s:   (K,S) source vector [outputs(N),peepholes(N),inputs(M)]
+        cec: (K,N) CEC states
+
+    Gate pre-activations are laid out node-major (node*4+channel)
+    so the gates of a level form a contiguous slice.
+
+    The Topology's weights are installed into the compiled storage
+    on first activation and again only once they have changed
+    (Connections.version counts changes made through the connection
+    mapping and Topology.loadWeights()).
+
+    Options:
+        layout    - 'dense' (default) stores (S,4N) weight matrices,
+                    'sparse' stores only edge lists sorted by sink
+                    (CSR style)
+        precision - 'float64' (default) or 'float32': the type of the
+                    compiled weights, network states and populations
+                    and of the arithmetic on them.  The Topology's own
+                    buffers (and the per-node path) stay float64, the
+                    reference to verify float32 results against.
+                    gradient() accumulates in float64 either way.
+
+    Both layouts accept a separate weight vector per network state
+    (K,E) which is evaluated from the edge lists.
+
+    -- Populations --
+
+    loadPopulation() holds K candidate weight vectors that advance
+    together on each Activate() until dropPopulation().  Meanwhile
+    Input terminals may be written with scalars or (K,) arrays and
+    Output terminals read back (K,) arrays, so an evaluator written
+    with elementwise arithmetic scores all K candidates in one pass.
+    """
+    def __init__(self,net,**kwargs):
+        self.net=net
+        self.layout='dense'
+        if 'layout' in kwargs:
+            self.layout=kwargs['layout']
+        if self.layout not in ['dense','sparse']:
+            raise TopologyError("NumpyEngine: unknown layout '%s'" % self.layout)
+        self.precision='float64'
+        if 'precision' in kwargs:
+            self.precision=kwargs['precision']
+        if self.precision not in ['float64','float32']:
+            raise TopologyError("NumpyEngine: unknown precision '%s'" % self.precision)
+        self.dtype=numpy.dtype(self.precision)
+        self.population=None
+        self.compile()
+
+    def compile(self):
+        """
+        Builds edge classification, level schedule and weight storage
+        """
+        net=self.net
+        order=list(net.activationOrder())
+        for n in order:
+            if not isinstance(n,LSTM_Node) or n.owner is not net:
+                raise TopologyError("NumpyEngine: node %s is not an LSTM_Node of this Topology" % n)
+        N=len(order)
+        pos={n:i for (i,n) in enumerate(order)}
+        edges=list(net.connections)
+        self.edgeCount=len(edges)
+
+        # levels follow the per-node activation order
+        feeders=[[] for n in order]
+        for (src,srcChan),(dest,destChan) in edges:
+            if srcChan==Input or destChan==Output:
+                continue
+            if pos[src]<pos[dest]:
+                feeders[pos[dest]].append(pos[src])
+        level=[0]*N
+        for i in range(N):
+            for j in feeders[i]:
+                level[i]=max(level[i],level[j]+1)
+        perm=sorted(range(N),key=lambda i:(level[i],i))
+        ix={order[i]:k for (k,i) in enumerate(perm)}
+        self.nodes=[order[i] for i in perm]
+        # row of each (renumbered) node in the Topology's state buffer
+        self.slots=numpy.array([order[i].base//LSTM_Node.stride for i in perm],dtype=numpy.intp)
+        bounds=[]
+        for k in range(N):
+            if k==0 or level[perm[k]]!=level[perm[k-1]]:
+                bounds.append(k)
+        bounds.append(N)
+        self.levels=list(zip(bounds[:-1],bounds[1:]))
+
+        # terminals
+        self.inputs=[]
+        inPos={}
+        for (src,srcChan),sink in edges:
+            if srcChan==Input and src not in inPos:
+                inPos[src]=len(self.inputs)
+                self.inputs.append(src)
+        self.outputs=list(net.outRefs)
+        outPos={o:i for (i,o) in enumerate(self.outputs)}
+        M=len(self.inputs)
+        self.N=N
+        self.S=2*N+M
+
+        def column(src,srcChan):
+            if srcChan==Input:
+                return 2*N+inPos[src]
+            if srcChan=='peephole':
+                return N+ix[src]
+            return ix[src]
+
+        stale=([],[],[])
+        fresh=([],[],[])
+        outs=([],[],[])
+        self.selfEdge=numpy.full(N,-1,dtype=numpy.intp)
+        for e,((src,srcChan),(dest,destChan)) in enumerate(edges):
+            col=column(src,srcChan)
+            if destChan==Output:
+                group,row=outs,outPos[dest]
+            else:
+                row=ix[dest]*4+gateIndex[destChan]
+                if src is dest and srcChan=='peephole' and destChan=='outputGate':
+                    self.selfEdge[ix[dest]]=e
+                    continue
+                if srcChan!=Input and pos[src]<pos[dest]:
+                    group=fresh
+                else:
+                    group=stale
+            group[0].append(e)
+            group[1].append(row)
+            group[2].append(col)
+        self.hasSelf=self.selfEdge>=0
+        self.selfIdx=numpy.where(self.hasSelf,self.selfEdge,0)
+
+        self.stale=self.makeBlock(stale,4*N)
+        self.fresh=self.makeBlock(fresh,4*N)
+        self.outBlock=self.makeBlock(outs,len(self.outputs))
+        # fresh edges of each level form a contiguous run
+        rows=self.fresh['rows']
+        self.freshRuns=[
+            (numpy.searchsorted(rows,4*a),numpy.searchsorted(rows,4*b))
+            for (a,b) in self.levels]
+        self.weights=None
+        # Topology weight version (Connections.version) installed
+        self.installed=None
+
+    def makeBlock(self,group,rowCount):
+        """
+        Sorts an edge group by sink row (CSR order)
+        """
+        eids,rows,cols=[numpy.array(x,dtype=numpy.intp) for x in group]
+        srt=numpy.argsort(rows,kind='stable')
+        block={'eids':eids[srt],'rows':rows[srt],'cols':cols[srt],'rowCount':rowCount}
+        if self.layout=='dense':
+            block['matrix']=numpy.zeros((self.S,rowCount),dtype=self.dtype)
+        return block
+
+    def setWeights(self,w):
+        """
+        Installs a weight vector (E,) or weight matrix (K,E)
+        in Topology.connections order
+        """
+        w=numpy.array(w,dtype=self.dtype)
+        self.weights=w
+        self.installed=None
+        # each node's own peephole to output gate weight (0 if none)
+        self.selfW=numpy.where(self.hasSelf,w[...,self.selfIdx],0.0).astype(self.dtype)
+        if self.selfW.ndim==1:
+            self.selfW=self.selfW[numpy.newaxis,:]
+        self.useMatrix=self.layout=='dense' and w.ndim==1
+        if self.useMatrix:
+            for block in [self.stale,self.fresh,self.outBlock]:
+                block['matrix'][block['cols'],block['rows']]=w[block['eids']]
+
+    def installWeights(self):
+        """
+        Installs the Topology's weights unless they are
+        installed already and unchanged since
+        """
+        version=self.net.connections.version
+        if self.installed!=version:
+            self.setWeights(self.pullWeights())
+            self.installed=version
+
+    def accumulate(self,block,s,target,lo=None,hi=None):
+        """
+        target[:,rows]+=weighted sources for the block's edges
+        (optionally only edges lo:hi when rows lo:hi are given)
+        """
+        if self.useMatrix:
+            if lo is None:
+                target+=s.dot(block['matrix'])
+            else:
+                target[:,lo:hi]+=s.dot(block['matrix'][:,lo:hi])
+            return
+        if lo is None:
+            first,last=0,len(block['eids'])
+        else:
+            first,last=lo,hi
+        if first==last:
+            return
+        eids=block['eids'][first:last]
+        rows=block['rows'][first:last]
+        contrib=self.weights[...,eids]*s[:,block['cols'][first:last]]
+        starts=numpy.flatnonzero(numpy.r_[True,rows[1:]!=rows[:-1]])
+        target[:,rows[starts]]+=numpy.add.reduceat(contrib,starts,axis=1)
+
+    def step(self,s,cec):
+        """
+        Advances K network states one time step
+
+            s:   (K,S) source vector, inputs already written
+            cec: (K,N) CEC states
+
+        s and cec are updated in place.  Returns the (K,N,4)
+        activated gate values.
+        """
+        N=self.N
+        K=s.shape[0]
+        pre=numpy.zeros((K,4*N),dtype=self.dtype)
+        self.accumulate(self.stale,s,pre)
+        gates=numpy.empty((K,N,4),dtype=self.dtype)
+        selfW=self.selfW
+        with numpy.errstate(over='ignore'):
+            for (a,b),(lo,hi) in zip(self.levels,self.freshRuns):
+                if lo==hi:
+                    # no fresh edges into this level (eg: the first)
+                    pass
+                elif self.useMatrix:
+                    self.accumulate(self.fresh,s,pre,4*a,4*b)
+                else:
+                    self.accumulate(self.fresh,s,pre,lo,hi)
+                g=pre[:,4*a:4*b].reshape(K,b-a,4)
+                gate=gates[:,a:b,:]
+                # input and its two gates squash together
+                gate[...,0:3]=logistic(g[...,0:3])
+                gate[...,0]=4.0*gate[...,0]-2.0
+                c=(cec[:,a:b]+gate[...,0]*gate[...,1])*gate[...,2]
+                cec[:,a:b]=c
+                peep=logistic(c)
+                s[:,N+a:N+b]=peep
+                gate[...,3]=logistic(g[...,3]+selfW[:,a:b]*peep)
+                s[:,a:b]=peep*gate[...,3]
+        return gates
+
+    def sample(self,s,squish=True):
+        """
+        Computes the (K,O) output terminal values of states s
+        """
+        y=numpy.zeros((s.shape[0],len(self.outputs)),dtype=self.dtype)
+        self.accumulate(self.outBlock,s,y)
+        if squish:
+            return sigmoid(y)
+        return y
+
+    def pullWeights(self):
+        """
+        View of the Topology's weight buffer (connections order)
+        """
+        return numpy.frombuffer(self.net.connections.weights,dtype=numpy.float64)
+
+    def stateView(self):
+        """
+        (nodes,LSTM_Node.stride) view of the Topology's state buffer
+
+        Only hold it briefly: the buffer cannot grow while viewed.
+        """
+        return numpy.frombuffer(self.net.state,dtype=numpy.float64).reshape(-1,LSTM_Node.stride)
+
+    def pullState(self):
+        """
+        Reads node and input terminal states into (1,S) s and (1,N) cec
+        """
+        N=self.N
+        rows=self.stateView()[self.slots]
+        s=numpy.empty((1,self.S),dtype=self.dtype)
+        s[0,:N]=rows[:,1]
+        s[0,N:2*N]=rows[:,2]
+        s[0,2*N:]=[t.read() for t in self.inputs]
+        return s,rows[numpy.newaxis,:,0].astype(self.dtype)
+
+    def pushState(self,s,cec,gates,row=0):
+        """
+        Writes one of K states back into the Topology's state buffer
+        """
+        N=self.N
+        rows=numpy.empty((N,LSTM_Node.stride))
+        rows[:,0]=cec[row]
+        rows[:,1]=s[row,:N]
+        rows[:,2]=s[row,N:2*N]
+        rows[:,3:]=gates[row]
+        self.stateView()[self.slots]=rows
+
+    def loadPopulation(self,W,states=None):
+        """
+        Holds K candidate weight vectors (K,E), each in
+        Topology.connections order (as OOPS.loadWeights uses them).
+        Every candidate starts from the nodes' current state or,
+        when states (K,2N) is given, from its own state vector in
+        Topology.saveState() layout (as OOPS.loadState uses them).
+        """
+        W=numpy.array(W,dtype=self.dtype,ndmin=2)
+        if W.shape[1]!=self.edgeCount:
+            raise TopologyError("NumpyEngine: population has %s weights, network has %s" % (
+                W.shape[1],self.edgeCount))
+        K=W.shape[0]
+        self.setWeights(W)
+        s,cec=self.pullState()
+        s=numpy.repeat(s,K,axis=0)
+        if states is None:
+            cec=numpy.repeat(cec,K,axis=0)
+        else:
+            states=numpy.array(states,dtype=self.dtype,ndmin=2)
+            if states.shape!=(K,2*self.N):
+                raise TopologyError("NumpyEngine: %s states of %s values given, population needs %s of %s" % (
+                    states.shape[0],states.shape[1],K,2*self.N))
+            N=self.N
+            cec=states[:,self.slots]
+            s[:,:N]=states[:,N+self.slots]
+            s[:,N:2*N]=sigmoid(cec)
+        gates=numpy.zeros((K,self.N,4),dtype=self.dtype)
+        self.population=[s,cec,gates,None]
+
+    def dropPopulation(self,keep=None):
+        """
+        Ends population mode.  When keep is given that candidate's
+        state is written back into the nodes and Output terminals.
+        """
+        if self.population is None:
+            return
+        s,cec,gates,y=self.population
+        self.population=None
+        if keep is not None:
+            self.pushState(s,cec,gates,keep)
+            if y is not None:
+                for o,v in zip(self.outputs,y[keep].tolist()):
+                    o.write(v)
+
+    def populationStates(self):
+        """
+        State vectors of the loaded population, one list per
+        candidate in Topology.saveState() layout
+        """
+        s,cec,gates,y=self.population
+        N=self.N
+        states=numpy.empty((s.shape[0],2*N))
+        states[:,self.slots]=cec
+        states[:,N+self.slots]=s[:,:N]
+        return states.tolist()
+
+    def frameColumns(self,frames,inputs):
+        """
+        (T,len(inputs)) frame array and the source vector columns
+        (dst) fed from frame columns (src)
+        """
+        X=numpy.array(frames,dtype=numpy.float64,ndmin=2)
+        if X.size==0:
+            X=X.reshape(0,len(inputs))
+        if X.shape[1]!=len(inputs):
+            raise TopologyError("NumpyEngine: frames have %s columns, %s inputs given" % (
+                X.shape[1],len(inputs)))
+        colOf={t:c for (c,t) in enumerate(inputs)}
+        fed=[(2*self.N+idx,colOf[t]) for (idx,t) in enumerate(self.inputs) if t in colOf]
+        dst=numpy.array([d for (d,c) in fed],dtype=numpy.intp)
+        src=numpy.array([c for (d,c) in fed],dtype=numpy.intp)
+        return X,dst,src
+
+    def outputColumns(self,outputs):
+        """
+        Positions of outputs among the engine's output terminals
+        """
+        outPos={o:i for (i,o) in enumerate(self.outputs)}
+        pick=[]
+        for o in outputs:
+            if o not in outPos:
+                raise TopologyError("NumpyEngine: %s is not an output of this Topology" % o)
+            pick.append(outPos[o])
+        return numpy.array(pick,dtype=numpy.intp)
+
+    def gradient(self,frames,targets,inputs,outputs):
+        """
+        Squared error of a sequence and its gradient with respect to
+        the weights, by backpropagation through time
+
+            frames:  (T,len(inputs)) input values
+            targets: (T,len(outputs)) wanted output values
+            inputs:  Input terminals matching the frame columns
+            outputs: Output terminals matching the target columns
+
+        Runs the frames from the nodes' current state exactly as
+        runSequence() does (the state and terminals are left at the
+        last frame) and returns (error,gradient):
+
+            error:    sum over frames and outputs of (out-target)^2
+            gradient: (E,) d(error)/d(weight) in Topology.connections
+                      order
+
+        The state the sequence starts from is taken as given, so
+        calling this on consecutive windows of a longer sequence is
+        truncated backpropagation through time.
+        """
+        if self.population is not None:
+            raise TopologyError("NumpyEngine: gradient() needs the population dropped")
+        X,dst,src=self.frameColumns(frames,inputs)
+        pick=self.outputColumns(outputs)
+        Y=numpy.array(targets,dtype=numpy.float64,ndmin=2)
+        if Y.shape!=(X.shape[0],len(pick)):
+            raise TopologyError("NumpyEngine: targets must be %s frames of %s outputs" % (
+                X.shape[0],len(pick)))
+        squish=self.net.SquishOutput
+        N=self.N
+        w=self.pullWeights().copy()
+        self.setWeights(w)
+        selfW=numpy.where(self.hasSelf,w[self.selfIdx],0.0)
+        s,cec=self.pullState()
+        gates=numpy.zeros((1,N,4),dtype=self.dtype)
+        y=None
+        # forward: keep each step's start and end states
+        trace=[]
+        error=0.0
+        for t in range(X.shape[0]):
+            s[:,dst]=X[t,src]
+            s0=s[0].copy()
+            c0=cec[0].copy()
+            gates=self.step(s,cec)
+            y=self.sample(s,squish)
+            delta=numpy.zeros(len(self.outputs))
+            numpy.add.at(delta,pick,2.0*(y[0,pick]-Y[t]))
+            error+=float(((y[0,pick]-Y[t])**2).sum())
+            trace.append((s0,c0,s[0].copy(),gates[0].copy(),y[0],delta))
+        for term,val in zip(inputs,X[-1].tolist() if X.shape[0] else []):
+            term.write(val)
+        if X.shape[0]:
+            self.pushState(s,cec,gates)
+            for o,v in zip(self.outputs,y[0].tolist()):
+                o.write(v)
+
+        # backward: ds and dc carry d(error) to the end state of each step
+        grad=numpy.zeros(self.edgeCount)
+        ds=numpy.zeros(self.S)
+        dc=numpy.zeros(N)
+        fresh,stale,outBlock=self.fresh,self.stale,self.outBlock
+        for s0,c0,s1,gate,y,delta in reversed(trace):
+            if squish:
+                delta=delta*y*(1.0-y)
+            self.backEdges(outBlock,0,len(outBlock['eids']),delta,s1,ds,grad)
+            dpre=numpy.zeros(4*N)
+            for (a,b),(lo,hi) in reversed(list(zip(self.levels,self.freshRuns))):
+                g=gate[a:b]
+                p=s1[N+a:N+b]
+                dOut=ds[a:b]
+                dOutGate=dOut*p*g[:,3]*(1.0-g[:,3])
+                dp=ds[N+a:N+b]+dOut*g[:,3]+dOutGate*selfW[a:b]
+                has=self.hasSelf[a:b]
+                grad[self.selfIdx[a:b][has]]+=(dOutGate*p)[has]
+                dCEC=dc[a:b]+dp*p*(1.0-p)
+                dGated=dCEC*g[:,2]
+                squashed=(g[:,0]+2.0)/4.0
+                pre=dpre[4*a:4*b].reshape(b-a,4)
+                pre[:,0]=dGated*g[:,1]*4.0*squashed*(1.0-squashed)
+                pre[:,1]=dGated*g[:,0]*g[:,1]*(1.0-g[:,1])
+                pre[:,2]=dCEC*(c0[a:b]+g[:,0]*g[:,1])*g[:,2]*(1.0-g[:,2])
+                pre[:,3]=dOutGate
+                dc[a:b]=dGated
+                self.backEdges(fresh,lo,hi,dpre,s1,ds,grad)
+            ds=numpy.zeros(self.S)
+            self.backEdges(stale,0,len(stale['eids']),dpre,s0,ds,grad)
+        return error,grad
+
+    def backEdges(self,block,lo,hi,dRows,s,ds,grad):
+        """
+        Backpropagates d(error)/d(row) through edges lo:hi of block:
+        adds each edge's weight gradient to grad and its source's
+        share to ds
+        """
+        if lo==hi:
+            return
+        eids=block['eids'][lo:hi]
+        rows=block['rows'][lo:hi]
+        cols=block['cols'][lo:hi]
+        d=dRows[rows]
+        grad[eids]+=d*s[cols]
+        numpy.add.at(ds,cols,self.weights[eids]*d)
+
+    def runSequence(self,frames,inputs,outputs):
+        """
+        Activates once per frame without leaving the engine
+
+            frames:  (T,len(inputs)) input values
+            inputs:  Input terminals matching the frame columns
+            outputs: Output terminals to sample
+
+        Engine inputs missing from inputs hold their current value.
+        State is read once before and written once after the run and
+        the terminals are left holding the last frame, as if
+        Activate() had been called T times.
+
+        Returns (T,outputs) values or (T,K,outputs) while a
+        population is loaded.
+        """
+        X,dst,src=self.frameColumns(frames,inputs)
+        pick=self.outputColumns(outputs)
+        squish=self.net.SquishOutput
+        if self.population is not None:
+            s,cec,gates,y=self.population
+        else:
+            self.installWeights()
+            s,cec=self.pullState()
+            gates=numpy.zeros((1,self.N,4),dtype=self.dtype)
+            y=None
+        found=numpy.empty((X.shape[0],s.shape[0],len(pick)),dtype=self.dtype)
+        for t in range(X.shape[0]):
+            s[:,dst]=X[t,src]
+            gates[...]=self.step(s,cec)
+            y=self.sample(s,squish)
+            found[t]=y[:,pick]
+        for term,val in zip(inputs,X[-1].tolist() if X.shape[0] else []):
+            term.write(val)
+        if self.population is not None:
+            self.population[3]=y
+            if y is not None:
+                for o,col in zip(self.outputs,y.T):
+                    o.write(col)
+            return found
+        if X.shape[0]:
+            self.pushState(s,cec,gates)
+            for o,v in zip(self.outputs,y[0].tolist()):
+                o.write(v)
+        return found[:,0,:]
+
+    def Activate(self):
+        """
+        Single network activation equivalent to the per-node path
+        or, while a population is loaded, one step of all candidates
+        """
+        if self.population is not None:
+            s,cec,gates,y=self.population
+            for idx,t in enumerate(self.inputs):
+                s[:,2*self.N+idx]=t.read()
+            gates[...]=self.step(s,cec)
+            y=self.sample(s,self.net.SquishOutput)
+            self.population[3]=y
+            for o,col in zip(self.outputs,y.T):
+                o.write(col)
+            return
+        self.installWeights()
+        s,cec=self.pullState()
+        gates=self.step(s,cec)
+        self.pushState(s,cec,gates)
+        for o,v in zip(self.outputs,self.sample(s,self.net.SquishOutput)[0].tolist()):
+            o.write(v)
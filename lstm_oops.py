@@ -25,25 +25,38 @@
     You should have received a copy of the GNU General Public License
     along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
-import pygame,os
-pygame.init()
-size=(640,320)
-visual=pygame.display.set_mode(size,pygame.DOUBLEBUF)
-elapsed=0
-since=pygame.time.get_ticks()
-framerate=1000.0/60.0
-font=pygame.font.SysFont("courier",18)
-textregion=pygame.Rect(0,230,640,30)
-
+import os
 import math
 import random
+import bisect
+import hashlib
+import inspect
 import sys
 import pprint
+from array import array
+from collections import OrderedDict,deque
+from collections.abc import MutableMapping
 from functools import partial
+from concurrent.futures import wait,FIRST_COMPLETED
+
+try:
+    import numpy
+except ImportError:
+    numpy=None
 
 NDEBUG=False
 
-EntropySource=random.SystemRandom()
+def makeEntropy(seed=None):
+    """
+    Creates a random generator for the trainer
+
+    numpy's Generator (which can draw blocks of uniforms at once)
+    when numpy is available otherwise random.Random.  Both are
+    seeded from os.urandom when seed is None.
+    """
+    if numpy is not None:
+        return numpy.random.default_rng(seed)
+    return random.Random(seed)
 Formatter=pprint.PrettyPrinter(indent=2)
 
 def blackhole(*args,**kwargs):
@@ -53,28 +66,61 @@ if NDEBUG:
 else:
     debug=print
 
-def log(self,msg,which='testLog'):
-    target=self.logs[which]
-    target.append(msg)
-    target=target[-100:]
+def log(self,msg,*args,which='testLog'):
+    """
+    Logs msg % args to the ring buffer which (the last self.size
+    messages are kept).  Formatting is put off until the message is
+    read by last() or a sink is attached to which.
+    """
+    target=self.logs.get(which)
+    if target is None:
+        target=self.logs[which]=deque(maxlen=self.size)
+    target.append((msg,args))
+    sinks=self.sinks.get(which)
+    if sinks:
+        text=formatted((msg,args))
+        for sink in sinks:
+            sink(text)
 
 def last(self,which='testLog'):
+    """
+    Most recent message of which (formatted) or None
+    """
     try:
-        return self.logs[which][-1]
-    except:
+        return formatted(self.logs[which][-1])
+    except (KeyError,IndexError):
         pass
 
+def formatted(entry):
+    msg,args=entry
+    if args:
+        return msg % args
+    return msg
+
+def attach(self,sink,which='testLog'):
+    """
+    Calls sink(message) with every message logged to which
+    """
+    self.sinks.setdefault(which,[]).append(sink)
+
+def detach(self,sink,which='testLog'):
+    self.sinks[which].remove(sink)
+
 _serNo=0
 def serNo():
     global _serNo
     _serNo+=1
     return _serNo
 
+log.size=100
 log.logs={}
-log.logs['testLog']=[]
-log.logs['solveLog']=[]
+log.logs['testLog']=deque(maxlen=log.size)
+log.logs['solveLog']=deque(maxlen=log.size)
+log.sinks={}
 log.last=partial(last,log)
 log.log=partial(log,log)
+log.attach=partial(attach,log)
+log.detach=partial(detach,log)
 
 halfPi=math.pi/2.0
 twoPi=math.pi*2.0
@@ -140,6 +186,306 @@ class Output(Terminal):
         return "OTERM%s=%s" % (self.serno,self.value)
 
 
+def doubles(values):
+    """
+    values as an array('d') (no copy when it already is one)
+    """
+    if isinstance(values,array) and values.typecode=='d':
+        return values
+    if numpy is not None and isinstance(values,numpy.ndarray):
+        buf=array('d')
+        buf.frombytes(numpy.ascontiguousarray(values,dtype=numpy.float64).tobytes())
+        return buf
+    return array('d',values)
+
+
+class Connections(MutableMapping):
+    """
+    Connection weights of a Topology
+
+    Behaves like a dictionary of { (source,sink) : weight } but
+    the weights are held in one contiguous array('d') buffer
+    (self.weights) indexed by connection insertion order
+    (self.index).  The edge index is fixed once a connection is
+    made so weight vectors are buffer copies in a stable order.
+
+    self.version counts changes to the weights made through the
+    mapping or Topology.loadWeights() so a compiled engine knows
+    when to reinstall them.
+    """
+    def __init__(self):
+        self.index={}
+        self.weights=array('d')
+        self.version=0
+    def __getitem__(self,edge):
+        return self.weights[self.index[edge]]
+    def __setitem__(self,edge,weight):
+        self.version+=1
+        idx=self.index.get(edge)
+        if idx is None:
+            self.index[edge]=len(self.weights)
+            self.weights.append(weight)
+        else:
+            self.weights[idx]=weight
+    def __delitem__(self,edge):
+        raise TopologyError("Connections cannot be removed.")
+    def __contains__(self,edge):
+        return edge in self.index
+    def __iter__(self):
+        return iter(self.index)
+    def __len__(self):
+        return len(self.weights)
+    def values(self):
+        return self.weights
+    def extend(self,edges,weight=1.0):
+        """
+        Sets every edge in edges to weight (adding new ones in order)
+        """
+        for edge in edges:
+            self[edge]=weight
+
+
+class SparseConnections(MutableMapping):
+    """
+    Compact connection store for large sparse Topologies
+    (eg: hypercubes)
+
+    Same mapping interface as Connections but rather than a
+    dictionary of nested tuple keys each connection is a single
+    int64 code in self.codes beside its weight in self.weights
+    (both in connection insertion order):
+
+        sink channel | sink | source | source channel
+           7 bits    24 bits 24 bits      8 bits
+
+    Endpoints (nodes and terminals) are numbered in self.points and
+    channels in self.channels.
+
+    The high half of a code is its sink key and sink keys sort
+    channel-major so the sorted sink keys (self.sinkKeys with the
+    matching connection ids in self.sinkOrder) form a CSR index
+    per sink channel: the connections feeding a sink channel are
+    one contiguous run, in insertion order, found by bisection.
+    A source index is built the same way on demand.
+
+    Indexes are rebuilt lazily.  Connections made since the last
+    rebuild wait in a small pending dictionary, so looking a
+    connection up is a bisection plus a scan of its sink's run
+    (cheap while fan-in is small).  About 32 bytes per connection.
+
+    self.version counts weight changes as in Connections.
+    """
+    pointBits=24
+    def __init__(self):
+        self.codes=array('q')
+        self.weights=array('d')
+        self.version=0
+        self.points=[]
+        self.pointIds={}
+        self.channels=[]
+        self.channelIds={}
+        self.pending={}
+        self.sinkKeys=array('q')
+        self.sinkOrder=array('q')
+        self.sourceIndex=None
+
+    def pointId(self,point,add=False):
+        idx=self.pointIds.get(point)
+        if idx is None and add:
+            idx=len(self.points)
+            if idx>=(1<<self.pointBits):
+                raise TopologyError("SparseConnections: too many endpoints")
+            self.points.append(point)
+            self.pointIds[point]=idx
+        return idx
+
+    def channelId(self,channel,add=False):
+        idx=self.channelIds.get(channel)
+        if idx is None and add:
+            idx=len(self.channels)
+            if idx>=127:
+                raise TopologyError("SparseConnections: too many channels")
+            self.channels.append(channel)
+            self.channelIds[channel]=idx
+        return idx
+
+    def encode(self,edge,add=False):
+        """
+        Code of ((source,channel),(sink,channel)) or None when an
+        endpoint or channel is unknown (and add is False)
+        """
+        (src,srcChan),(dest,destChan)=edge
+        ids=(self.channelId(destChan,add),self.pointId(dest,add),
+             self.pointId(src,add),self.channelId(srcChan,add))
+        if None in ids:
+            return None
+        destChan,dest,src,srcChan=ids
+        return (((((destChan<<24)|dest)<<24)|src)<<8)|srcChan
+
+    def decode(self,code):
+        points=self.points
+        channels=self.channels
+        return ((points[(code>>8)&0xffffff],channels[code&0xff]),
+                (points[(code>>32)&0xffffff],channels[code>>56]))
+
+    def sinkKey(self,sink,channel):
+        dest=self.pointIds.get(sink)
+        destChan=self.channelIds.get(channel)
+        if dest is None or destChan is None:
+            return None
+        return (destChan<<24)|dest
+
+    def sourceKey(self,source,channel):
+        src=self.pointIds.get(source)
+        srcChan=self.channelIds.get(channel)
+        if src is None or srcChan is None:
+            return None
+        return (src<<8)|srcChan
+
+    def reindex(self):
+        """
+        Rebuilds the sorted sink index, clearing pending
+        """
+        count=len(self.codes)
+        if numpy is not None:
+            keys=numpy.frombuffer(self.codes,dtype=numpy.int64)>>32
+            order=numpy.argsort(keys,kind='stable')
+            sinkKeys=array('q',keys[order].tobytes())
+            sinkOrder=array('q',order.astype(numpy.int64).tobytes())
+            del keys
+        else:
+            codes=self.codes
+            order=sorted(range(count),key=lambda e:codes[e]>>32)
+            sinkKeys=array('q',[codes[e]>>32 for e in order])
+            sinkOrder=array('q',order)
+        self.sinkKeys=sinkKeys
+        self.sinkOrder=sinkOrder
+        self.pending.clear()
+
+    def makeSourceIndex(self):
+        codes=self.codes
+        if numpy is not None:
+            keys=numpy.frombuffer(codes,dtype=numpy.int64)&0xffffffff
+            order=numpy.argsort(keys,kind='stable')
+            self.sourceIndex=(array('q',keys[order].tobytes()),
+                              array('q',order.astype(numpy.int64).tobytes()))
+            del keys
+        else:
+            order=sorted(range(len(codes)),key=lambda e:codes[e]&0xffffffff)
+            self.sourceIndex=(array('q',[codes[e]&0xffffffff for e in order]),
+                              array('q',order))
+
+    def run(self,keys,order,key):
+        if key is None:
+            return []
+        lo=bisect.bisect_left(keys,key)
+        hi=bisect.bisect_right(keys,key,lo)
+        return order[lo:hi].tolist()
+
+    def sinkRun(self,sink,channel):
+        """
+        Ids of the connections feeding sink's channel
+        in insertion order
+        """
+        if self.pending:
+            self.reindex()
+        return self.run(self.sinkKeys,self.sinkOrder,self.sinkKey(sink,channel))
+
+    def sourceRun(self,source,channel):
+        """
+        Ids of the connections leaving source's channel
+        in insertion order
+        """
+        if self.sourceIndex is None:
+            self.makeSourceIndex()
+        keys,order=self.sourceIndex
+        return self.run(keys,order,self.sourceKey(source,channel))
+
+    def lookup(self,code):
+        """
+        Connection id of code or None
+        """
+        if code is None:
+            return None
+        idx=self.pending.get(code)
+        if idx is not None:
+            return idx
+        codes=self.codes
+        for e in self.run(self.sinkKeys,self.sinkOrder,code>>32):
+            if codes[e]==code:
+                return e
+        return None
+
+    def edge(self,idx):
+        return self.decode(self.codes[idx])
+
+    def __getitem__(self,edge):
+        idx=self.lookup(self.encode(edge))
+        if idx is None:
+            raise KeyError(edge)
+        return self.weights[idx]
+    def __setitem__(self,edge,weight):
+        self.version+=1
+        code=self.encode(edge,add=True)
+        idx=self.lookup(code)
+        if idx is None:
+            self.pending[code]=len(self.codes)
+            self.codes.append(code)
+            self.weights.append(weight)
+            self.sourceIndex=None
+            if len(self.pending)>max(4096,len(self.codes)>>3):
+                self.reindex()
+        else:
+            self.weights[idx]=weight
+    def __delitem__(self,edge):
+        raise TopologyError("Connections cannot be removed.")
+    def __contains__(self,edge):
+        return self.lookup(self.encode(edge)) is not None
+    def __iter__(self):
+        decode=self.decode
+        for code in self.codes:
+            yield decode(code)
+    def __len__(self):
+        return len(self.weights)
+    def values(self):
+        return self.weights
+    def extend(self,edges,weight=1.0):
+        """
+        Sets every edge in edges to weight (adding new ones in order)
+
+        New edges are deduplicated and appended as one block
+        followed by a single index rebuild.
+        """
+        self.version+=1
+        codes=[self.encode(edge,add=True) for edge in edges]
+        if numpy is None:
+            for code in codes:
+                idx=self.lookup(code)
+                if idx is None:
+                    self.pending[code]=len(self.codes)
+                    self.codes.append(code)
+                    self.weights.append(weight)
+                else:
+                    self.weights[idx]=weight
+            self.reindex()
+            self.sourceIndex=None
+            return
+        if self.pending:
+            self.reindex()
+        new=numpy.array(codes,dtype=numpy.int64)
+        # first occurrence of each code, in order
+        first=numpy.sort(numpy.unique(new,return_index=True)[1])
+        new=new[first]
+        known=numpy.isin(new,numpy.frombuffer(self.codes,dtype=numpy.int64))
+        for code in new[known].tolist():
+            self.weights[self.lookup(code)]=weight
+        new=new[~known]
+        self.codes.frombytes(new.tobytes())
+        self.weights.extend(array('d',[weight])*len(new))
+        self.reindex()
+        self.sourceIndex=None
+
+
 class Topology:
     """
     Maintains ANN/RNN network topology
@@ -170,55 +516,149 @@ class Topology:
     
     read("connName")
         - reads value connName
+
+    Weights are stored in self.connections.weights (see Connections)
+    and the states of LSTM_Nodes in self.state, an array('d') holding
+    LSTM_Node.stride slots per node in self.nodeRefs order.
+
+    Options:
+        sparse - True keeps connections in a SparseConnections
+                 store (for large sparse networks such as
+                 hypercubes) instead of a Connections dictionary
     
     """
     def __init__(self,*args,**kwargs):
-        self.connections={}
+        self.sparse=False
+        if 'sparse' in kwargs:
+            self.sparse=kwargs['sparse']
+        if self.sparse:
+            self.connections=SparseConnections()
+        else:
+            self.connections=Connections()
+        self.state=array('d')
         self.nodeRefs={}
+        self.inRefs={}
         self.outRefs={}
         self.SquishOutput=True
+        self.ordered=None
+        self.feeds=None
+        self.inEdges=None
+        self.outEdges=None
+        self.engine=None
+        self.compiled=None
 
-    def enableOutputLogistic(enable=True):
+    def enableOutputLogistic(self,enable=True):
         """
         Enables or disables logistical
         squishing of output terminal values
         """
         self.SquishOutput=enable
 
+    def enableEngine(self,engine=None):
+        """
+        Selects how Activate() evaluates the network
+
+            engine: None for the per-node path (default) or a
+                    callable compiling the Topology into an object
+                    with an Activate() method, eg:
+                        lstm_engine.NumpyEngine
+                        partial(lstm_engine.NumpyEngine,layout='sparse')
+
+        The engine is compiled on next activation and recompiled
+        whenever Connect() changes the network.
+        """
+        self.engine=engine
+        self.compiled=None
+
+    def compileEngine(self):
+        """
+        Returns the compiled engine, compiling it if needed
+        """
+        if self.engine is None:
+            raise TopologyError("compileEngine: no engine enabled")
+        if self.compiled is None:
+            self.compiled=self.engine(self)
+        return self.compiled
+
     def makeOrdered(self):
+        """
+        Compiles the activation schedule in O(edges)
+
+        Nodes are ordered by hop count from the input terminals,
+        breadth first along the connections.  Nodes at the same hop
+        count keep Connect() order and cycles are cut where they
+        close (a node is scheduled when first reached).  Nodes no
+        input reaches follow in Connect() order.
+
+            ordered: nodes in activation order
+            feeds:   { (sink,channel) : [(weight index,source,
+                       source channel), ...] } the work items
+                       getInputs() sums, in connection order
+                       (not built for a SparseConnections store
+                       which is its own index)
+
+        Discarded by Connect() and rebuilt on next activation.
+        """
+        position={n:i for (i,n) in enumerate(self.nodeRefs)}
+        successors={}
+        feeds={}
+        for e,C in enumerate(self.connections):
+            (src,srcChan),dest=C
+            if dest[1]!=Output:
+                successors.setdefault(src,[]).append(dest[0])
+            if not self.sparse:
+                feeds.setdefault(dest,[]).append((e,src,srcChan))
         ordered=[]
-        visited={C:False for C in self.connections}
-        # dry run activation pass (no states are harmed)
-        # to yield connections in order they
-        # will be accessed but we want
-        # the first connection access to
-        # be at the end of the list
-        for n in self.nodeRefs:
-            # the nodes we want are all the ones connected
-            # to any input channels (we rely on the node
-            # object to order this list so the non-depending
-            # inputs come first).  for instance an LSTM node
-            # lists outputgate after forgetgate since outputgate
-            # may source the peephole which depends on forgetgate
-            # (this is a special dependency specific to the LSTM
-            # node's implementation of peepholes to allow output
-            # gates to react to a *change* in CEC state)
-            for ch in n.availableConnectionPoints(InputOnly=True):
-                sources=self.getSources(n,ch)
-                for s in sources:
-                    if not visited[s]:
-                        ordered=[s]+ordered
-                        visited[s]=True
-        for n in self.outRefs:
-            # now the output edges
-            sources=self.getSources(n,Output)
-            for s in sources:
-                if not visited[s]:
-                    ordered=[s]+ordered
-                    visited[s]=True        
+        reached=set()
+        frontier=list(self.inRefs)
+        while frontier:
+            hop=[]
+            for src in frontier:
+                for n in successors.get(src,[]):
+                    if n not in reached:
+                        reached.add(n)
+                        hop.append(n)
+            hop.sort(key=position.__getitem__)
+            ordered.extend(hop)
+            frontier=hop
+        ordered.extend(n for n in self.nodeRefs if n not in reached)
         self.ordered=ordered
-            
-        
+        self.feeds=None if self.sparse else feeds
+
+    def activationOrder(self):
+        """
+        Nodes in the order Activate() runs them (see makeOrdered)
+        """
+        if self.ordered is None:
+            self.makeOrdered()
+        return self.ordered
+
+    def makeIndex(self):
+        """
+        Compiles the adjacency index used by getInputs(),
+        getSources() and getTargets()
+
+            inEdges:  { (sink,channel)   : [connection, ...] }
+            outEdges: { (source,channel) : [connection, ...] }
+
+        Edges are listed in self.connections order so sums
+        taken over an index entry match a full edge scan.
+        The index is discarded by Connect() and rebuilt here
+        on next use so a full activation pass is O(edges).
+
+        A SparseConnections store is its own index so none is
+        built for it.
+        """
+        if self.sparse:
+            return
+        inEdges={}
+        outEdges={}
+        for C in self.connections:
+            orig,dest=C
+            inEdges.setdefault(dest,[]).append(C)
+            outEdges.setdefault(orig,[]).append(C)
+        self.inEdges=inEdges
+        self.outEdges=outEdges
 
     def Connect(self,source,sink):
         """
@@ -280,34 +720,15 @@ class Topology:
             destPoints=sink
 
         # validate connection specs
-        origCount=len(origPoints)
-        idx=0
-        for CP in origPoints+destPoints:
+        for CP in origPoints:
             # origPoints want an output channel
-            isSource=1
-            if idx>=origCount:
-                # destPoints want an input channel
-                isSource=0
-            try:
-                cpNode,cpChan=CP
-            except TypeError:
-                raise TopologyError("Connect: %s not of form (x,y) or [x,y]" % CP)
-            if not cpChan in [Input,Output]:
-                try:
-                    aCPs=cpNode.availableConnectionPoints()
-                except AttributeError:
-                    raise TopologyError("Connect: %s: %s is not a valid node" % (CP,cpNode))
-                if cpChan not in aCPs.keys():
-                    raise TopologyError("Connect: node %s: no such port %s" % (cpNode,cpChan))
-                if aCPs[cpChan]!=isSource:
-                    raise TopologyError("Connect: connection %s is not an %s" % (\
-                        CP, ['input','output'][isSource]))
-            else:
-                if cpChan==Input and not isSource==1:
-                    raise TopologyError("Connect: illegal incoming connection to input terminal")
-                if cpChan==Output and isSource==1:
-                    raise TopologyError("Connect: illegal outgoing connection from output terminal")
-            idx=idx+1
+            self.checkPoint(CP,1)
+        for CP in destPoints:
+            # destPoints want an input channel
+            self.checkPoint(CP,0)
+
+        # a compiled engine may hold views of the buffers
+        self.compiled=None
 
         # make connections
         for orig in origPoints:
@@ -317,49 +738,232 @@ class Topology:
                 self.connections[C]=1.0
                 # memoize nodes involved with connection
                 # to improve performance of Activate()
-                if orig[1]!=Input:
-                    self.nodeRefs[orig[0]]=True
-                if dest[1]!=Output:
-                    self.nodeRefs[dest[0]]=True
+                self.addEndpoints(orig,dest)
 
-        # indicate network is unsorted
+        # indicate network is unsorted, unindexed and uncompiled
         self.ordered=None
+        self.feeds=None
+        self.inEdges=None
+        self.outEdges=None
+        self.compiled=None
         
         # returns the input or output terminal if one was created
         # otherwise None
         return newbie
 
+    def ConnectBulk(self,edges):
+        """
+        Makes many connections at once
+
+            edges: iterable of (source,sink) 2-tuples of single
+                   connection points, terminals given as
+                   (terminal,Input) or (terminal,Output)
+
+        Same result as Connect(source,sink) for each pair in turn
+        but each distinct connection point is validated once, all
+        pairs are validated before any is connected and the network
+        is reordered and reindexed once.  Terminals are not created
+        here: make them with Input() and Output().
+        """
+        edges=list(edges)
+        sources={}
+        sinks={}
+        for orig,dest in edges:
+            if orig not in sources:
+                self.checkPoint(orig,1)
+                sources[orig]=True
+            if dest not in sinks:
+                self.checkPoint(dest,0)
+                sinks[dest]=True
+
+        # a compiled engine may hold views of the buffers
+        self.compiled=None
+
+        self.connections.extend(edges,1.0)
+        for orig,dest in edges:
+            self.addEndpoints(orig,dest)
+
+        # indicate network is unsorted, unindexed and uncompiled
+        self.ordered=None
+        self.feeds=None
+        self.inEdges=None
+        self.outEdges=None
+        self.compiled=None
+
+    def checkPoint(self,CP,isSource):
+        """
+        Validates connection point CP as a source (isSource=1)
+        or a sink (isSource=0)
+        """
+        try:
+            cpNode,cpChan=CP
+        except (TypeError,ValueError):
+            raise TopologyError("Connect: %s not of form (x,y) or [x,y]" % (CP,))
+        if not cpChan in [Input,Output]:
+            try:
+                aCPs=cpNode.availableConnectionPoints()
+            except AttributeError:
+                raise TopologyError("Connect: %s: %s is not a valid node" % (CP,cpNode))
+            if cpChan not in aCPs.keys():
+                raise TopologyError("Connect: node %s: no such port %s" % (cpNode,cpChan))
+            if aCPs[cpChan]!=isSource:
+                raise TopologyError("Connect: connection %s is not an %s" % (\
+                    CP, ['input','output'][isSource]))
+        else:
+            if cpChan==Input and not isSource==1:
+                raise TopologyError("Connect: illegal incoming connection to input terminal")
+            if cpChan==Output and isSource==1:
+                raise TopologyError("Connect: illegal outgoing connection from output terminal")
+
+    def addEndpoints(self,orig,dest):
+        """
+        Registers the nodes and terminals of a new connection
+        """
+        if orig[1]!=Input:
+            self.addNode(orig[0])
+        else:
+            self.inRefs[orig[0]]=1
+        if dest[1]!=Output:
+            self.addNode(dest[0])
+        else:
+            self.outRefs[dest[0]]=1
+
+    def addNode(self,n):
+        """
+        Registers a node, moving an LSTM_Node's state into self.state
+        """
+        if n in self.nodeRefs:
+            return
+        if isinstance(n,LSTM_Node):
+            if n.owner is not None:
+                raise TopologyError("Connect: node %s already belongs to another Topology" % n)
+            n.bind(self,len(self.state))
+        self.nodeRefs[n]=True
+
     def getTargets(self,source,channel):
         """
         Get list of connection destinations for the specified source
         """
-        found=[]
-        for (src,srcChan),(dest,destChan) in self.connections:
-            if src==source and srcChan==channel:
-                found.append((dest,destChan))
-        return found
+        if self.sparse:
+            edge=self.connections.edge
+            return [edge(e)[1] for e in self.connections.sourceRun(source,channel)]
+        if self.outEdges is None:
+            self.makeIndex()
+        return [dest for (orig,dest) in self.outEdges.get((source,channel),[])]
 
     def getInputs(self,sink,channel):
         """
         Gets list of all weighted values feeding to the specified sink
         """
-        found=[]
-        for (src,srcChan),(dest,destChan) in self.connections:
-            if dest==sink and destChan==channel:
-                w=self.connections[((src,srcChan),(dest,destChan))]
-                value=w*src.read(channel=srcChan)
-                found.append(value)
-        return found
+        if self.sparse:
+            store=self.connections
+            weights=store.weights
+            found=[]
+            for e in store.sinkRun(sink,channel):
+                src,srcChan=store.edge(e)[0]
+                found.append(weights[e]*src.read(channel=srcChan))
+            return found
+        if self.ordered is None:
+            self.makeOrdered()
+        weights=self.connections.weights
+        return [weights[e]*src.read(channel=srcChan)
+                for (e,src,srcChan) in self.feeds.get((sink,channel),())]
 
     def getSources(self,sink,channel):
         """
         Gets list of all connections feeding specified sink
         """
+        if self.sparse:
+            edge=self.connections.edge
+            return [edge(e) for e in self.connections.sinkRun(sink,channel)]
+        if self.inEdges is None:
+            self.makeIndex()
+        return []+self.inEdges.get((sink,channel),[])
+
+    def saveWeights(self):
+        """
+        Weight vector (list) of all connections in edge index order
+        """
+        return self.connections.weights.tolist()
+
+    def loadWeights(self,Wts):
+        """
+        Applies a weight vector from saveWeights()
+        (a list, array('d') or numpy array)
+        """
+        weights=self.connections.weights
+        if len(Wts)!=len(weights):
+            raise TopologyError("loadWeights: %s weights given, network has %s" % (
+                len(Wts),len(weights)))
+        weights[:]=doubles(Wts)
+        self.connections.version+=1
+
+    def saveState(self):
+        """
+        State vector (list) of node CECs followed by node outputs
+        """
+        stride=LSTM_Node.stride
+        return self.state[0::stride].tolist()+self.state[1::stride].tolist()
+
+    def loadState(self,innerState):
+        """
+        Applies a state vector from saveState()
+        """
+        stride=LSTM_Node.stride
+        count=len(self.state)//stride
+        if len(innerState)!=2*count:
+            raise TopologyError("loadState: %s states given, network has %s" % (
+                len(innerState),2*count))
+        CECs=doubles(innerState[:count])
+        self.state[0::stride]=CECs
+        self.state[1::stride]=doubles(innerState[count:])
+        self.state[2::stride]=array('d',[sigmoid(c) for c in CECs])
+
+    def ActivateSequence(self,frames,inputs=None,outputs=None):
+        """
+        Activates the network once per input frame
+
+            frames:  sequence of T frames, each a sequence holding
+                     one value per input terminal
+            inputs:  input terminals matching the frame columns
+                     (default: self.inRefs order)
+            outputs: output terminals to sample
+                     (default: self.outRefs order)
+
+        returns (output frames,final state)
+            output frames: T lists of output values
+            final state:   as saveState()
+
+        With an engine enabled the whole sequence runs inside the
+        engine (see NumpyEngine.runSequence).  While the engine holds
+        a population the output frames are a (T,K,outputs) array
+        and the final state a list of K states.
+        """
+        if inputs is None:
+            inputs=list(self.inRefs)
+        if outputs is None:
+            outputs=list(self.outRefs)
+        if self.engine is not None:
+            engine=self.compileEngine()
+            found=engine.runSequence(frames,inputs,outputs)
+            if engine.population is not None:
+                return found,engine.populationStates()
+            return found.tolist(),self.saveState()
         found=[]
-        for (src,srcChan),(dest,destChan) in self.connections:
-            if dest==sink and destChan==channel:
-                found.append(((src,srcChan),(dest,destChan)))
-        return found
+        Activate=self.Activate
+        for frame in frames:
+            for term,val in zip(inputs,frame):
+                term.write(val)
+            Activate()
+            found.append([o.read() for o in outputs])
+        return found,self.saveState()
+
+    def __getstate__(self):
+        # derived structures are rebuilt on demand after unpickling
+        state=dict(self.__dict__)
+        for k in ['ordered','feeds','inEdges','outEdges','compiled']:
+            state[k]=None
+        return state
 
     def Activate(self):
         """
@@ -371,10 +975,13 @@ class Topology:
         levels are sampled (ie: the Output nodes written with
         values) after all nodes activate.            
         """
+        if self.engine is not None:
+            self.compileEngine().Activate()
+            return
         if self.ordered is None:
             self.makeOrdered()
         # activate each node
-        for n in self.nodeRefs:
+        for n in self.ordered:
             n.Activate(self)
         # node activations are done now activate each output
         for o in self.outRefs:
@@ -412,6 +1019,11 @@ class LSTM_Node:
 
     optional:
         output activation function
+
+    The node's CEC, outputs and gate values occupy stride slots
+    (see slotMap) of a buffer.  A fresh node has a private buffer;
+    connecting it in a Topology moves its state into the Topology's
+    state buffer so whole network states are buffer copies.
         
     """
     iConns=["input","inputGate","forgetGate","outputGate"]
@@ -421,23 +1033,41 @@ class LSTM_Node:
             [(x,0) for x in iConns] + \
             [(x,1) for x in oConns]
         }
+    slotMap={k:v for (v,k) in enumerate(["CEC","output","peephole"]+iConns)}
+    stride=len(slotMap)
     def __init__(self,*args,**kwargs):
         """ sets up node """
-        self.CEC=0.0
         self.serNo=serNo()
-        self.states={k:v for (k,v) in [(x,0.0) for x in LSTM_Node.oConns]}
-        for chan in LSTM_Node.iConns:
-            self.states[chan]={
-                "value":None,
-                }
+        self.owner=None
+        self.buf=array('d',[0.0]*LSTM_Node.stride)
+        self.base=0
+    def bind(self,net,base):
+        """
+        Moves node state to slots base.. at the end of net.state
+        """
+        net.state.extend(self.buf[self.base:self.base+LSTM_Node.stride])
+        self.buf=net.state
+        self.base=base
+        self.owner=net
+    def getCEC(self):
+        return self.buf[self.base]
+    def setCEC(self,val):
+        self.buf[self.base]=val
+    CEC=property(getCEC,setCEC)
+    def getStates(self):
+        """ snapshot of node states (read only) """
+        info={k:self.read(channel=k) for k in LSTM_Node.oConns}
+        for k in LSTM_Node.iConns:
+            info[k]={"value":self.read(channel=k)}
+        return info
+    states=property(getStates)
     def __lt__(self,n):
         return self.serNo<n.serNo
     def __str__(self):
-        info="{'CEC':%s,'peephole':%s,'output':%s,'inputs':%s}" % (\
-        self.CEC,self.states['peephole'],\
-        self.states['output'],\
-        { k:self.states[k] for k in LSTM_Node.iConns})
-        return Formatter.pformat(eval(info))
+        info=self.states
+        info['CEC']=self.CEC
+        info['inputs']={k:info.pop(k) for k in LSTM_Node.iConns}
+        return Formatter.pformat(info)
         
     def availableConnectionPoints(self,**kwargs):
         """ enumerate connection points """
@@ -453,11 +1083,8 @@ class LSTM_Node:
         """
         if "channel" in kwargs:
             ch=kwargs["channel"]
-            if ch in LSTM_Node.connMap.keys():
-                if ch in LSTM_Node.oConns:
-                    return self.states[ch]
-                else:
-                    return self.states[ch]['value']
+            if ch in LSTM_Node.connMap:
+                return self.buf[self.base+LSTM_Node.slotMap[ch]]
             else:
                 raise NodeError("LSTM_Node: no such channel '%s'" % ch)
         else:
@@ -467,26 +1094,350 @@ class LSTM_Node:
         """
         perform activation pass
         """
+        buf=self.buf
+        b=self.base
         # activate input and scale to [-2,2]
-        self.states['input']['value']=4.0*sigmoid(sum(net.getInputs(self,'input')))-2.0
+        inp=4.0*sigmoid(sum(net.getInputs(self,'input')))-2.0
+        buf[b+3]=inp
         # activate inputGate
-        self.states['inputGate']['value']=sigmoid(sum(net.getInputs(self,'inputGate')))
+        inGate=sigmoid(sum(net.getInputs(self,'inputGate')))
+        buf[b+4]=inGate
         # compute gated input
-        gatedInput=self.states['input']['value']*self.states['inputGate']['value']
+        gatedInput=inp*inGate
         # apply input to internal state
-        self.CEC=self.CEC+gatedInput
+        CEC=buf[b]+gatedInput
         # activate forget gate
-        self.states['forgetGate']['value']=sigmoid(sum(net.getInputs(self,'forgetGate')))
+        forgetGate=sigmoid(sum(net.getInputs(self,'forgetGate')))
+        buf[b+5]=forgetGate
         # gate internal state (applies forgetfulness)
-        self.CEC=self.CEC*self.states['forgetGate']['value']
+        CEC=CEC*forgetGate
+        buf[b]=CEC
         # squish the ungated output (peephole)
-        self.states['peephole']=sigmoid(self.CEC)
+        peephole=sigmoid(CEC)
+        buf[b+2]=peephole
         # activate output gate
         # NB: This is done after squished peephole value is known 
         # so that the fresh CEC state is visible to the output gate
-        self.states['outputGate']['value']=sigmoid(sum(net.getInputs(self,'outputGate')))
+        outGate=sigmoid(sum(net.getInputs(self,'outputGate')))
+        buf[b+6]=outGate
         # gate (already squished) output
-        self.states['output']=self.states['peephole']*self.states['outputGate']['value']
+        buf[b+1]=peephole*outGate
+
+
+class SolutionStore:
+    """
+    Bounded solution store ordered by descending fitness
+
+    Weight vectors are kept in rows of a preallocated buffer,
+    weights, a flat array('d') of capacity rows (a row-major 2-D
+    buffer).  Rows are never moved; a rank index of (key,row) pairs
+    kept sorted with bisect gives rank-ordered access:
+
+        store[rank]  - ((weights,states),fitness) as lists
+                       (rank 0 is the fittest)
+
+    insert() finds its place by binary search, O(log n) comparisons,
+    then shifts the index entries ranked below it: an O(n) move of
+    (key,row) references, never of weight rows.  When the store is
+    full a solution ranking below every stored one is turned away,
+    otherwise the worst solution, the last rank, is evicted.  Among
+    equally fit solutions the newest ranks first.
+
+    CEC states (timestamps) are interned: solutions found at the
+    same timestamp, as all those of an epoch usually are, share one
+    snapshot.  Snapshots occupy slots of states, a flat array('d')
+    grown only as distinct timestamps arrive, and are reference
+    counted (stateRefs) so a slot is recycled once no row uses it.
+    stateOf maps each row to its slot.
+
+    precision 'float32' stores weights and states as array('f'),
+    halving the store (vectors still come out as lists of floats).
+    """
+    def __init__(self,capacity,weightCount,stateCount,precision='float64'):
+        if precision not in ['float64','float32']:
+            raise TypeError("SolutionStore: unknown precision '%s'" % precision)
+        self.capacity=max(1,capacity)
+        self.weightCount=weightCount
+        self.stateCount=stateCount
+        self.precision=precision
+        self.typecode={'float64':'d','float32':'f'}[precision]
+        self.weights=array(self.typecode,bytes(array(self.typecode).itemsize*self.capacity*weightCount))
+        self.keys=[]
+        self.free=list(range(self.capacity-1,-1,-1))
+        self.serial=0
+        self.states=array(self.typecode)
+        self.stateOf=array('q',[-1])*self.capacity
+        self.stateRefs=array('q')
+        self.stateFree=[]
+        # snapshot digest -> slot, and each slot's digest
+        self.stateIndex={}
+        self.stateKeys=[]
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __getitem__(self,rank):
+        key,row=self.keys[rank]
+        return ((self.weightsAt(rank),self.statesAt(rank)),-key[0])
+
+    def rowOf(self,rank):
+        return self.keys[rank][1]
+
+    def weightsAt(self,rank):
+        """ weight vector (list) of solution at rank """
+        row=self.keys[rank][1]
+        E=self.weightCount
+        return self.weights[row*E:(row+1)*E].tolist()
+
+    def statesAt(self,rank):
+        """ CEC state vector (list) of solution at rank """
+        return self.snapshot(self.stateSlotAt(rank)).tolist()
+
+    def stateSlotAt(self,rank):
+        """ snapshot slot holding the CEC state of solution at rank """
+        return self.stateOf[self.keys[rank][1]]
+
+    def snapshot(self,slot):
+        """ CEC state held in slot (array('d') copy) """
+        S=self.stateCount
+        return self.states[slot*S:(slot+1)*S]
+
+    def snapshotCount(self):
+        """ distinct CEC states held """
+        return len(self.stateRefs)-len(self.stateFree)
+
+    def pack(self,values):
+        """
+        values as an array of the store's precision
+        """
+        buf=doubles(values)
+        if self.typecode=='d':
+            return buf
+        return array('f',buf)
+
+    def intern(self,state):
+        """
+        Slot holding state, adding a reference to an equal snapshot
+        when there is one
+        """
+        buf=self.pack(state)
+        key=hashlib.blake2b(buf,digest_size=16).digest()
+        slot=self.stateIndex.get(key)
+        if slot is not None and self.snapshot(slot)==buf:
+            self.stateRefs[slot]+=1
+            return slot
+        S=self.stateCount
+        if self.stateFree:
+            slot=self.stateFree.pop()
+            self.states[slot*S:(slot+1)*S]=buf
+            self.stateRefs[slot]=1
+        else:
+            slot=len(self.stateRefs)
+            self.states.extend(buf)
+            self.stateRefs.append(1)
+            self.stateKeys.append(None)
+        if key not in self.stateIndex:
+            # (a digest collision leaves the snapshot unshared)
+            self.stateIndex[key]=slot
+            self.stateKeys[slot]=key
+        return slot
+
+    def release(self,slot):
+        """
+        Drops a reference to the snapshot in slot
+        """
+        self.stateRefs[slot]-=1
+        if self.stateRefs[slot]==0:
+            key=self.stateKeys[slot]
+            if key is not None:
+                del self.stateIndex[key]
+                self.stateKeys[slot]=None
+            self.stateFree.append(slot)
+
+    def reindexStates(self):
+        """
+        Rebuilds the snapshot index from states and stateRefs
+        """
+        self.stateIndex={}
+        self.stateKeys=[None]*len(self.stateRefs)
+        for slot,refs in enumerate(self.stateRefs):
+            if refs:
+                key=hashlib.blake2b(self.snapshot(slot),digest_size=16).digest()
+                if key not in self.stateIndex:
+                    self.stateIndex[key]=slot
+                    self.stateKeys[slot]=key
+
+    def fitnessAt(self,rank):
+        return -self.keys[rank][0][0]
+
+    def insert(self,Wts,state,fitness):
+        """
+        Stores a solution, evicting the worst one when full
+
+        returns False (storing nothing) when the store is full and
+        the solution is less fit than all of them
+        """
+        if len(Wts)!=self.weightCount or len(state)!=self.stateCount:
+            raise TypeError("SolutionStore: solution does not fit the store.")
+        if not self.free:
+            if -fitness>self.keys[-1][0][0]:
+                return False
+            key,row=self.keys.pop()
+            self.release(self.stateOf[row])
+            self.free.append(row)
+        row=self.free.pop()
+        E=self.weightCount
+        self.weights[row*E:(row+1)*E]=self.pack(Wts)
+        self.stateOf[row]=self.intern(state)
+        self.serial+=1
+        bisect.insort(self.keys,((-fitness,-self.serial),row))
+        return True
+
+    def refit(self,rank,fitness):
+        """
+        Changes the fitness of the solution at rank (eg: re-scored
+        from its own snapshot), moving it to its new rank
+        """
+        key,row=self.keys.pop(rank)
+        bisect.insort(self.keys,((-fitness,key[1]),row))
+
+    def rescore(self,scorer):
+        """
+        Re-ranks every solution by scorer(weights,states)
+        """
+        rescored=[]
+        for rank in range(len(self.keys)):
+            (key,row)=self.keys[rank]
+            fitness=scorer(self.weightsAt(rank),self.statesAt(rank))
+            rescored.append(((-fitness,key[1]),row))
+        self.keys=sorted(rescored)
+
+    def weightMatrix(self):
+        """
+        (capacity,weightCount) numpy view of the weight rows
+        """
+        return numpy.frombuffer(self.weights,dtype=self.precision).reshape(
+            self.capacity,self.weightCount)
+
+
+class FitnessCache:
+    """
+    Bounded LRU cache of evaluation results
+
+    Keyed by the evaluator and a digest of the weight vector and
+    starting CEC state; holds the fitness and the CEC state the
+    evaluation finished in.  Only valid for evaluators whose result
+    depends solely on the network's weights and state.
+
+        hits, misses - lookup counters
+    """
+    def __init__(self,size=4096):
+        self.size=max(1,size)
+        self.entries=OrderedDict()
+        self.hits=0
+        self.misses=0
+
+    def key(self,evalfunc,Wts,state):
+        digest=hashlib.blake2b(digest_size=16)
+        digest.update(doubles(Wts).tobytes())
+        digest.update(doubles(state).tobytes())
+        return (evalfunc,digest.digest())
+
+    def get(self,key):
+        """
+        (fitness,final state) or None when not cached
+        """
+        found=self.entries.get(key)
+        if found is None:
+            self.misses+=1
+        else:
+            self.hits+=1
+            self.entries.move_to_end(key)
+        return found
+
+    def put(self,key,fitness,final):
+        self.entries[key]=(fitness,final)
+        self.entries.move_to_end(key)
+        while len(self.entries)>self.size:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+
+class Budget:
+    """
+    Evaluation budget for evaluators that can stop early
+
+    An evaluator taking a budget keyword argument is handed the
+    fitness a candidate must beat (bar).  An evaluator whose fitness
+    can only fall as its test goes on (eg: accumulated error) may
+    check its fitness so far and stop once the candidate has lost:
+
+        def Tester(net,budget=None):
+            err=0.0
+            for ...:
+                ...
+                err+=delta*delta
+                if budget is not None and budget.exhausted(-err):
+                    break
+            return -err
+
+    The trainer then records the result as a PartialFitness.
+    """
+    def __init__(self,bar=float("-inf")):
+        self.bar=bar
+        self.stopped=False
+
+    def exhausted(self,fitness):
+        """
+        True once fitness can no longer beat the bar (in population
+        mode once none of the (K,) fitnesses can)
+        """
+        if numpy is not None and isinstance(fitness,numpy.ndarray):
+            lost=bool((fitness<=self.bar).all())
+        else:
+            lost=fitness<=self.bar
+        if lost:
+            self.stopped=True
+        return lost
+
+class PartialFitness(float):
+    """
+    Fitness of an evaluation stopped by its Budget, an upper
+    bound of the candidate's fitness
+    """
+    pass
+
+def takesBudget(evalfunc):
+    """
+    True when evalfunc accepts a budget keyword argument
+    """
+    try:
+        params=inspect.signature(evalfunc).parameters
+    except (TypeError,ValueError):
+        return False
+    if 'budget' in params:
+        return params['budget'].kind!=inspect.Parameter.POSITIONAL_ONLY
+    return any(p.kind==inspect.Parameter.VAR_KEYWORD for p in params.values())
+
+def budgeted(evalfunc,net,bar=None,takes=None):
+    """
+    Calls evalfunc(net), with a Budget when it takes one (takes,
+    default takesBudget(evalfunc)) and a bar is given
+
+    returns (fitness,True when the evaluation stopped early or
+    evalfunc itself returned a PartialFitness)
+    """
+    if takes is None:
+        takes=takesBudget(evalfunc)
+    if bar is None or not takes:
+        rank=evalfunc(net)
+        # eg: an lstm_async timeout
+        return (rank,isinstance(rank,PartialFitness))
+    budget=Budget(bar)
+    rank=evalfunc(net,budget=budget)
+    return (rank,budget.stopped or isinstance(rank,PartialFitness))
 
 
 class OOPS:
@@ -657,27 +1608,146 @@ class OOPS:
             Arguments:
                 Topology     - The Topology for trainer to operate on
                 maxSolutions - Solution store maximum size (default 1000)        
+                batchSize    - Mutants evaluated together per evaluator
+                               call in TrainingEpoch_Evolve (default 1,
+                               also with an Executor: pass eg: 64 to
+                               have the pool score whole batches)
+                Executor     - Factory taking (Topology,evaluator) and
+                               returning a pool that evaluates batches
+                               of mutants, eg: lstm_parallel.EvaluationPool
+                               or lstm_async.AsyncEvaluationPool
+                Random       - Random generator with a uniform(lo,hi)
+                               method, eg: numpy.random.default_rng(42)
+                               or random.Random(42)
+                seed         - Seed for the default generator
+                               (see makeEntropy) when Random is not given
+                cacheSize    - Size of the FitnessCache consulted before
+                               evaluating a mutant (default 0: no cache)
+                mutantCount  - Mutants bred per TrainingEpoch_Evolve
+                               (default 1000)
+                checkpoint   - File TrainingEpoch_Evolve periodically
+                               saves the trainer to (see
+                               lstm_checkpoint, default None: never)
+                checkpointEvery
+                             - Epochs between checkpoints (default 10)
+                learnRate    - TrainingEpoch_Backprop step size
+                               (default 0.01)
+                window       - TrainingEpoch_Backprop truncation: frames
+                               backpropagated through per weight update
+                               (default None: the whole sequence)
+                precision    - 'float64' (default) or 'float32' storage
+                               of the solution store (see SolutionStore;
+                               for float32 evaluation see NumpyEngine's
+                               precision option)
+                timeTravel   - Past timestamps (distinct stored CEC
+                               states, fittest first) each mutant is
+                               also tested at in TrainingEpoch_Evolve,
+                               search step 4 (default 0: none)
+
+            Batched evaluation:
+                With batchSize>1 the Topology must have an engine
+                that supports populations (lstm_engine.NumpyEngine,
+                see Topology.enableEngine).  The evaluator is then
+                called once per batch of K mutants: Input terminals
+                accept scalars or (K,) arrays, Output terminals read
+                as (K,) arrays and the evaluator returns K fitnesses.
+                Every mutant in a batch starts from the same CEC
+                state and is bred before any of the batch is scored.
+
+            Time travel:
+                Step 4 tests every mutant of a batch at every past
+                timestamp as one (mutants x timestamps) grid (see
+                evaluateGrid).  With an engine the grid is a single
+                population whose rows share a mutant's weights and
+                start from their own timestamp's CEC state.
+
+            Parallel evaluation:
+                With an Executor batches are instead handed to the
+                pool which evaluates each mutant with the ordinary
+                (scalar) evaluator on worker copies of the Topology.
+                Results are credited in mutant order, but as with
+                the engine a batch is bred from the solutions as
+                they were when the batch began and all of it starts
+                from the batch's starting CEC state, so the search
+                does not follow the sequential (batchSize 1) one.
+                With batchSize=1 (the default) each mutant is its
+                own batch and the pool reproduces sequential
+                evaluation exactly; larger batches are an opt-in.
         """
         self.maxSolutions=1000
         if 'maxSolutions' in kwargs:
             self.maxSolutions=kwargs['maxSolutions']
         self.maxSolutions=max(1,self.maxSolutions)
 
+        self.precision='float64'
+        if 'precision' in kwargs:
+            self.precision=kwargs['precision']
+
+        self.executor=None
+        self.pool=None
+        if 'Executor' in kwargs:
+            self.executor=kwargs['Executor']
+
+        self.mutantCount=1000
+        if 'mutantCount' in kwargs:
+            self.mutantCount=max(1,kwargs['mutantCount'])
+
+        self.checkpoint=None
+        if 'checkpoint' in kwargs:
+            self.checkpoint=kwargs['checkpoint']
+        self.checkpointEvery=10
+        if 'checkpointEvery' in kwargs:
+            self.checkpointEvery=max(1,kwargs['checkpointEvery'])
+
+        self.learnRate=0.01
+        if 'learnRate' in kwargs:
+            self.learnRate=kwargs['learnRate']
+        self.window=None
+        if 'window' in kwargs:
+            self.window=kwargs['window']
+        # shrinks while gradient steps fail to improve (see TrainingEpoch_Backprop)
+        self.stepScale=1.0
+        # (structure,NumpyEngine) gradientEngine compiled
+        self.backpropEngine=None
+        self.timeTravel=0
+        if 'timeTravel' in kwargs:
+            self.timeTravel=max(0,int(kwargs['timeTravel']))
+
+        self.cache=None
+        if kwargs.get('cacheSize'):
+            self.cache=FitnessCache(kwargs['cacheSize'])
+
+        self.batchSize=1
+        if 'batchSize' in kwargs:
+            self.batchSize=max(1,kwargs['batchSize'])
+
         # make list of mutation operator references
         self.mutationOps=[getattr(self,'mutate%s'%i) for i in [
             'Splice','Radical','Sign','Swap','Transpose','Tumor']]
+        # and their (K,E) mutant matrix versions (need numpy)
+        self.batchOps=[getattr(self,'mutateBatch%s'%i) for i in [
+            'Splice','Radical','Sign','Swap','Transpose','Tumor']]
         
+        self.observers=[]
+
         self.net=None
         if 'Topology' in kwargs:
             self.net=kwargs['Topology']
         if self.net is None:
             raise TypeError("OOPS: No network specified.")
+        if self.batchSize>1 and self.executor is None and self.net.engine is None:
+            raise TypeError("OOPS: batchSize needs a Topology engine (see Topology.enableEngine).")
+
+        if 'Random' in kwargs:
+            self.entropy=kwargs['Random']
+        else:
+            self.entropy=makeEntropy(kwargs.get('seed'))
+        self.batchEntropy=None
 
         # randomize initial weights
-        for c in self.net.connections:
-            self.net.connections[c]=EntropySource.uniform(-.1,1)
+        self.net.loadWeights(self.uniforms(-.1,1,len(self.net.connections)))
         for n in self.net.nodeRefs:
-            n.CEC=EntropySource.uniform(-.1,.1)
+            n.CEC=self.entropy.uniform(-.1,.1)
             n.output=0.0
 
         """
@@ -691,7 +1761,10 @@ class OOPS:
             candidate and timestamp (CEC state), and thus
             completely ready to test, when called
         """
-        self.solutions=[]
+        self.solutions=SolutionStore(self.maxSolutions,
+                                     len(self.net.connections),
+                                     len(self.net.saveState()),
+                                     self.precision)
         self.evalfunc=None
         if 'Evaluator' in kwargs:
             self.changeEvaluator(kwargs['Evaluator'])
@@ -742,127 +1815,356 @@ class OOPS:
         self.resetAffect()
         
         self.currentSolves=0
+        # evaluations stopped early by their Budget
+        self.partialEvaluations=0
+        # completed TrainingEpoch_Evolve calls
+        self.epochs=0
+        # TrainingEpoch_SteadyState mutants being evaluated by the pool
+        self.inFlight=[]
+        self.steadyAlternate=0
         self.minFitness=float("inf")
         self.maxFitness=float("-inf")
 
         self.TrainingEpoch=self.TrainingEpoch_Backprop
 
+    def uniforms(self,lo,hi,count):
+        """
+        List of count uniform draws from [lo,hi), drawn as one
+        block when the generator supports it (numpy Generator)
+        """
+        if numpy is not None and isinstance(self.entropy,numpy.random.Generator):
+            return self.entropy.uniform(lo,hi,count).tolist()
+        return [self.entropy.uniform(lo,hi) for i in range(count)]
+
+    def sampleIndices(self,n,count):
+        """
+        count distinct indices drawn from range(n)
+
+        Any generator is shuffled with uniform() alone (the first
+        count steps of a Fisher-Yates shuffle) so no draw is ever
+        rejected.
+        """
+        if numpy is not None and isinstance(self.entropy,numpy.random.Generator):
+            return self.entropy.choice(n,count,replace=False).tolist()
+        picked=list(range(n))
+        for idx in range(count):
+            other=min(n-1,idx+int(self.entropy.uniform(0,n-idx)))
+            picked[idx],picked[other]=picked[other],picked[idx]
+        return picked[:count]
+
+    def generator(self):
+        """
+        numpy Generator for the batch operators: the trainer's own
+        entropy when it is one, otherwise one seeded from it
+        """
+        if isinstance(self.entropy,numpy.random.Generator):
+            return self.entropy
+        if self.batchEntropy is None:
+            # seeded with uniform() draws, all a Random must provide
+            self.batchEntropy=numpy.random.default_rng(
+                [int(self.entropy.uniform(0,2**32)) for i in range(4)])
+        return self.batchEntropy
+
+    def attach(self,observer):
+        """
+        Adds an observer (eg: lstm_visual.Visualizer) whose
+        evaluated(trainer,newRk,**kwargs) method is called after
+        every scored evaluation
+        """
+        self.observers.append(observer)
+
+    def detach(self,observer):
+        self.observers.remove(observer)
+
     def evaluator(self,net,**kwargs):
-        global visual,elapsed,since,framerate,font,textregion
-        
-        for evt in pygame.event.get():
-            if evt.type == pygame.QUIT:
-                raise KeyboardInterrupt
-        now=pygame.time.get_ticks()
-        delta=now-since
-        elapsed+=delta
-        since=now
-            
-        weightCount=len(self.net.connections)
-        
-        newRk=self.evalfunc(net)
-        self.minFitness=min(self.minFitness,newRk)
-        self.maxFitness=max(self.maxFitness,newRk)
+        """
+        Scores net with the evaluator
+
+        An evaluator taking a budget gets bar, or failing that
+        originalFitness (when given), as its bar.  A result it
+        stopped early is returned as a PartialFitness and is not
+        cached.
+        """
+        if 'bar' in kwargs:
+            bar=kwargs.pop('bar')
+        else:
+            bar=kwargs.get('originalFitness')
+        if self.cache is None:
+            newRk=self.score(net,bar)
+        else:
+            key=self.cache.key(self.evalfunc,net.connections.weights,net.saveState())
+            found=self.cache.get(key)
+            if found is None:
+                newRk=self.score(net,bar)
+                if not isinstance(newRk,PartialFitness):
+                    self.cache.put(key,newRk,net.saveState())
+            else:
+                newRk,final=found
+                net.loadState(final)
+        return self.scoreResult(newRk,**kwargs)
+
+    def score(self,net,bar=None):
+        """
+        One evaluator call (see Budget)
+        """
+        rank,stopped=budgeted(self.evalfunc,net,bar,self.budgeted)
+        if stopped:
+            self.partialEvaluations+=1
+            return PartialFitness(rank)
+        return rank
+
+    def evaluatePopulation(self,mutants,bar=None):
+        """
+        Scores K weight vectors with one evaluator call
+        (or one pool submission when an Executor is in use)
+
+        Each vector is applied as loadWeights() would apply it and
+        all start from the Topology's current CEC state.  Afterwards
+        the nodes hold the final state of the last vector, as if the
+        vectors were evaluated one after another.
+
+        bar is handed to an evaluator taking a budget.  With the
+        engine the population stops as a whole, once no candidate
+        can beat bar.
         
-        bgColor=(0,0,128)
-        divColor=(0,0,0)
+        returns list of K fitnesses (PartialFitness when stopped early)
+        """
+        start=self.saveState()
+        if self.cache is None:
+            results=self.runPopulation(mutants,start,bar)
+        else:
+            keys=[self.cache.key(self.evalfunc,Wts,start) for Wts in mutants]
+            results=[self.cache.get(key) for key in keys]
+            todo=[idx for idx in range(len(mutants)) if results[idx] is None]
+            if todo:
+                fresh=self.runPopulation([mutants[idx] for idx in todo],start,bar)
+                for idx,(rk,final) in zip(todo,fresh):
+                    if not isinstance(rk,PartialFitness):
+                        self.cache.put(keys[idx],rk,final)
+                    results[idx]=(rk,final)
+        self.loadState(results[-1][1])
+        ranks=[rk for (rk,final) in results]
+        self.partialEvaluations+=sum(isinstance(rk,PartialFitness) for rk in ranks)
+        return ranks
+
+    def runPopulation(self,mutants,start,bar=None):
+        """
+        Evaluates K weight vectors from state start on the engine
+        or pool, returns list of (fitness,final state)
+        """
+        if self.executor is not None:
+            if self.pool is None:
+                self.pool=self.executor(self.net,self.evalfunc)
+            return self.pool.evaluate(mutants,start,bar)
+        engine=self.net.compileEngine()
+        engine.loadPopulation(mutants)
+        try:
+            ranks,stopped=budgeted(self.evalfunc,self.net,bar,self.budgeted)
+            finals=engine.populationStates()
+        finally:
+            engine.dropPopulation(keep=len(mutants)-1)
+        kind=PartialFitness if stopped else float
+        return [(kind(rk),final) for (rk,final) in zip(ranks,finals)]
+
+    def scoreResult(self,newRk,**kwargs):
+        # partial fitnesses are only bounds and a non-finite one
+        # (eg: a timed out lstm_async candidate) no measure at all
+        complete=not isinstance(newRk,PartialFitness) and math.isfinite(newRk)
+        if complete:
+            self.minFitness=min(self.minFitness,newRk)
+            self.maxFitness=max(self.maxFitness,newRk)
         
-        if 'original' in kwargs and 'current' in kwargs and 'originalFitness' in kwargs:
+        if ('original' in kwargs and 'current' in kwargs and 'originalFitness' in kwargs and
+            complete and math.isfinite(newRk-kwargs['originalFitness'])):
+            # nor are they (or gains over such a fitness) credited
+            # to the weights
             org=kwargs['original']
             cur=kwargs['current']
             oldRk=kwargs['originalFitness']
             self.updateAffect(org,cur,newRk-oldRk)
-            
-            if elapsed>framerate:
-                
-                while elapsed>framerate:
-                    elapsed-=framerate
-
-                r=pygame.Rect(16,10,6*weightCount-1,211)
-                pygame.draw.rect(visual,bgColor,r)
-                for x in range(weightCount):
-                    bar=100*self.weightAffect[x]
-                    xbar=100-bar
-                    #pygame.draw.line(visual,(255,0,0),(18+x*6,10), (18+x*6,10+xbar),5)
-                    pygame.draw.line(visual,(0,255,0),(18+x*6,110),(18+x*6,110-bar),5)
-                    prevBar=100*sigmoid(org[x])
-                    xPrevBar=100-prevBar
-                    curBar=100*sigmoid(cur[x])
-                    xCurBar=100-curBar
-                    pygame.draw.line(visual,bgColor,(16+x*6,120),(16+x*6,120+xPrevBar),2)
-                    pygame.draw.line(visual,(255,0,255),  (16+x*6,220),(16+x*6,220-prevBar),2)
-                    pygame.draw.line(visual,bgColor,(19+x*6,120),(19+x*6,120+xCurBar),2)
-                    pygame.draw.line(visual,(128,0,255),  (19+x*6,220),(19+x*6,220-curBar),2)
-                    if (x+1)<weightCount:
-                        pygame.draw.line(visual,divColor,(21+x*6,10),(21+x*6,220),1)
-
-                nameImg=font.render(self.testId,True,(160,160,224))
-                pygame.draw.rect(visual,(0,0,0),textregion)
-                visual.blit(nameImg,(16,234))
-
-            pygame.display.flip()
+
+        for observer in self.observers:
+            observer.evaluated(self,newRk,**kwargs)
         
         return newRk
 
+    def scorePopulation(self,ranks,originals,mutants,originalFitnesses):
+        """
+        scoreResult's bookkeeping for K mutants at once: fitness
+        range and a single batched affect update of the completed
+        evaluations (observers are left to the caller)
+        """
+        complete=numpy.array([not isinstance(rk,PartialFitness) for rk in ranks],dtype=bool)
+        ranks=numpy.asarray(ranks,dtype=numpy.float64)
+        complete&=numpy.isfinite(ranks)
+        lows=numpy.minimum.accumulate(numpy.r_[self.minFitness,
+                                               numpy.where(complete,ranks,numpy.inf)])[1:]
+        highs=numpy.maximum.accumulate(numpy.r_[self.maxFitness,
+                                                numpy.where(complete,ranks,-numpy.inf)])[1:]
+        self.minFitness=float(lows[-1])
+        self.maxFitness=float(highs[-1])
+        with numpy.errstate(invalid='ignore'):
+            nets=ranks-numpy.asarray(originalFitnesses,dtype=numpy.float64)
+        complete&=numpy.isfinite(nets)
+        if complete.all():
+            self.updateAffect(originals,mutants,nets,highs-lows)
+        elif complete.any():
+            keep=numpy.flatnonzero(complete).tolist()
+            self.updateAffect([originals[k] for k in keep],[mutants[k] for k in keep],
+                              nets[keep],(highs-lows)[keep])
+
     def resetAffect(self):
-        self.weightAffect=[1.0]*len(self.net.connections)
+        # unnormalized, hence not called weightAffect as the
+        # normalized affects once were: the affects the mutator sees
+        # are (rawAffect-affectOffset)/affectScale (read affects())
+        self.rawAffect=array('d',[1.0])*len(self.net.connections)
+        self.affectOffset=0.0
+        self.affectScale=1.0
+        # running (min,max) of affects()
+        self.affectRange=(1.0,1.0)
         self.affectInit=True
 
-    def updateAffect(self,priorWts,currentWts,netFitness):
+    def affects(self):
+        """
+        Weight affects normalized to [0,1] (array('d')), the
+        values the mutator blends by
+        """
+        if self.affectOffset==0.0 and self.affectScale==1.0:
+            return self.rawAffect
+        if numpy is not None:
+            raw=numpy.frombuffer(self.rawAffect,dtype=numpy.float64)
+            return doubles((raw-self.affectOffset)/self.affectScale)
+        return array('d',[(a-self.affectOffset)/self.affectScale for a in self.rawAffect])
+
+    def updateAffect(self,priorWts,currentWts,netFitness,fScale=None):
         """
         Updates weight affects then renormalizes to [0,1]
         where 0 is worst affect, 1 is best
+
+        Batched form: currentWts is a (K,E) matrix (priorWts (E,)
+        or (K,E)) with netFitness and fScale (the fitness range each
+        update sees, default maxFitness-minFitness) holding K values.
+        The K updates are applied in order, as K calls would.
+
+        An update adds its change to the unnormalized affects and
+        finds their new range.  Renormalizing only moves
+        affectOffset and affectScale (see normalizeAffect) so the
+        affects are never rewritten, and an update that changes
+        nothing (no fitness change or no fitness range) touches no
+        affect at all.
+        """
+        if fScale is None:
+            fScale=self.maxFitness-self.minFitness
+        if numpy is None:
+            return self.updateAffectList(priorWts,currentWts,netFitness,fScale)
+        self.affectInit=False
+        affect=numpy.frombuffer(self.rawAffect,dtype=numpy.float64)
+        cur=numpy.asarray(currentWts,dtype=numpy.float64)
+        if cur.ndim==1:
+            cur=cur[numpy.newaxis,:]
+        if cur.shape[1]!=len(affect):
+            raise TypeError("updateActivity: Incompatible weightspaces (sizes differ).")
+        K=cur.shape[0]
+        if len(affect)==0 or K==0:
+            return
+        nets=numpy.broadcast_to(numpy.asarray(netFitness,dtype=numpy.float64),(K,))
+        fScales=numpy.broadcast_to(numpy.asarray(fScale,dtype=numpy.float64),(K,))
+        # noramlizes magnitude of modification
+        # 1.0=most, 0.0=least
+        mags=cur-numpy.asarray(priorWts,dtype=numpy.float64)
+        numpy.abs(mags,out=mags)
+        spans=mags.max(axis=1)-mags.min(axis=1)
+        # prevent dividum byzeroum
+        rates=nets/numpy.where(fScales==0.0,numpy.inf,fScales)
+        active=(rates!=0.0)&(spans!=0.0)
+        lo,hi=self.affectRange
+        for k,(changes,rate,span) in enumerate(zip(active.tolist(),rates.tolist(),spans.tolist())):
+            if changes:
+                affect+=mags[k]*(rate/span*self.affectScale)
+                lo=(float(affect.min())-self.affectOffset)/self.affectScale
+                hi=(float(affect.max())-self.affectOffset)/self.affectScale
+            lo,hi=self.normalizeAffect(lo,hi)
+        self.affectRange=(lo,hi)
+        self.rebaseAffect()
+
+    def updateAffectList(self,priorWts,currentWts,netFitness,fScale):
+        """
+        updateAffect for a single update without numpy
         """
         weightCount=len(priorWts)
         self.affectInit=False
-        if len(priorWts)-len(currentWts)+len(self.weightAffect)-len(priorWts)!=0:
-            raise TypeErorr("updateActivity: Incompatible weightspaces (sizes differ).")
-        topChg=float("-Inf")
-        btmChg=float("Inf")
-        fScale=self.maxFitness-self.minFitness
+        if len(currentWts)!=len(self.rawAffect):
+            raise TypeError("updateActivity: Incompatible weightspaces (sizes differ).")
         if fScale==0.0:
             fScale=float("Inf")
-        # noramlizes magnitude of modification
-        # 1.0=most, 0.0=least
-        for idx in range(weightCount):
-            magnitude=math.fabs(currentWts[idx]-priorWts[idx])
-            change=magnitude*(netFitness/fScale)
-            topChg=max(topChg,magnitude)
-            btmChg=min(btmChg,magnitude)
-        offset=btmChg
-        scale=topChg-btmChg
-        if scale==0.0:
-            # prevent dividum byzeroum
-            scale=float("Inf")
-        minAff=0
-        maxAff=0
-        for idx in range(weightCount):
-            magnitude=math.fabs(currentWts[idx]-priorWts[idx])
-            change=(magnitude/scale)*(netFitness/fScale)
-            affect=self.weightAffect[idx]+change
-            self.weightAffect[idx]=affect
-            minAff=min(minAff,affect)
-            maxAff=max(maxAff,affect)
-        offset=minAff
+        lo,hi=self.affectRange
+        if weightCount:
+            mags=[math.fabs(currentWts[idx]-priorWts[idx]) for idx in range(weightCount)]
+            scale=max(mags)-min(mags)
+            if scale==0.0:
+                # prevent dividum byzeroum
+                scale=float("Inf")
+            rate=netFitness/fScale
+            if rate!=0.0 and scale!=float("Inf"):
+                affect=self.rawAffect
+                step=rate*self.affectScale
+                for idx in range(weightCount):
+                    affect[idx]=affect[idx]+(mags[idx]/scale)*step
+                lo=(min(affect)-self.affectOffset)/self.affectScale
+                hi=(max(affect)-self.affectOffset)/self.affectScale
+        self.affectRange=self.normalizeAffect(lo,hi)
+        self.rebaseAffect()
+
+    def normalizeAffect(self,lo,hi):
+        """
+        Renormalizes affects() ranging over [lo,hi] to [0,1]
+        (0 stays in range) by adjusting affectOffset and
+        affectScale, returns the new range
+        """
+        minAff=min(0.0,lo)
+        maxAff=max(0.0,hi)
+        if minAff==0.0 and maxAff==1.0:
+            # already normalized
+            return lo,hi
         scale=maxAff-minAff
         if scale==0.0:
-            # prevent dividum byzeroum
-            scale=float("Inf")
-        for idx in range(weightCount):
-            nAffect=(self.weightAffect[idx]-offset)/scale
-            self.weightAffect[idx]=nAffect
+            # every affect is already 0
+            return 0.0,0.0
+        self.affectOffset+=minAff*self.affectScale
+        self.affectScale*=scale
+        return (lo-minAff)/scale,(hi-minAff)/scale
+
+    def rebaseAffect(self):
+        """
+        Folds affectOffset and affectScale back into rawAffect
+        before the scale drifts out of floating point range
+        """
+        if 2.0**-64<self.affectScale<2.0**64:
+            return
+        self.rawAffect=array('d',self.affects())
+        self.affectOffset=0.0
+        self.affectScale=1.0
 
     def changeEvaluator(self,testFunc):
         self.evalfunc=testFunc
+        self.budgeted=takesBudget(testFunc)
+        if self.cache is not None:
+            self.cache.clear()
+        if self.pool is not None:
+            # workers hold a copy of the old evaluator
+            self.pool.close()
+            self.pool=None
+        # steady state evaluations still out are for the old evaluator
+        self.inFlight=[]
         self.minFitness=float("Inf")
         self.maxFitness=float("-Inf")
-        if self.solutions==[]:
+        if len(self.solutions)==0:
             save=self.saveSnapshot()
             rank=self.evalfunc(self.net)
             self.minFitness=min(self.minFitness,rank)
-            self.maxFitness=max(self.minFitness,rank)
+            self.maxFitness=max(self.maxFitness,rank)
             log.log(log.last(),which='solveLog')
-            self.solutions=[(save,rank)]
+            self.solutions.insert(save[0],save[1],rank)
             self.rank=rank
             self.loadSnapshot(save)
         else:
@@ -871,17 +2173,15 @@ class OOPS:
             # to change evaluator we need to reevaluate solutions
             # then resort them by descenidng fitness
             #print("*** Trainer changed - reevaluating solutions")
-            for idx in range(len(self.solutions)):
-                ((sW,sS),sR)=self.solutions[idx]
+            def rescore(sW,sS):
                 self.loadSnapshot((sW,sS))
                 sR=self.evalfunc(self.net)
                 #print("  %s" % log.last())
-                self.solutions[idx]=((sW,sS),sR)                
                 self.minFitness=min(self.minFitness,sR)
-                self.maxFitness=max(self.minFitness,sR)
+                self.maxFitness=max(self.maxFitness,sR)
+                return sR
+            self.solutions.rescore(rescore)
             self.loadSnapshot(save)
-            # re-sort solutions by descending fitness of new evaluation regime
-            self.solutions=sorted(self.solutions,key=lambda s:s[1],reverse=True)
 
     def TrainingEpoch_Backprop(self,**kwargs):
         """
@@ -917,32 +2217,135 @@ class OOPS:
         but we don't need that step... the normalized "error delta"
         will substitute where we would normally have needed
         expectedResult-actualResult
-        
-        """
-        ((curWt,curSt),curRk)=self.solutions[0]
-        self.loadWeights(curWt)
-        self.loadState(curSt)
 
-        learnRate=0.0001
+        -- Supervised sequences --
+
+        Where the expected results are known they are used
+        directly.  The teacher signal is taken from kwargs or,
+        failing that, from attributes of the evaluator (eg:
+        lstm_bench.SequenceFitness):
+
+            frames  - T input frames, one value per input terminal
+            targets - T frames of expected output terminal values
+            inputs  - input terminals of the frame columns
+                      (default: Topology.inRefs order)
+            outputs - output terminals of the target columns
+                      (default: Topology.outRefs order)
+
+        Starting from the best solution's weights and state the
+        sequence is run through the compiled network
+        (lstm_engine.NumpyEngine.gradient) in windows of
+        self.window frames, taking a gradient descent step on the
+        squared output error after each window (truncated
+        backpropagation through time).  The best solution is
+        first re-scored from its own snapshot (its stored fitness
+        may have been measured from elsewhere, eg: changeEvaluator
+        scores the live network) and the result, scored the same
+        way, is stored when it improves on it.  A step that fails
+        to improve halves stepScale (multiplying learnRate) for the
+        next epoch and one that succeeds grows it back; once below
+        2^-10 stepScale starts again from 1 rather than stall.
+
+        learnRate and window override the trainer's settings.
+        Without a teacher signal the epoch is a TrainingEpoch_Evolve.
+        """
+        teacher={}
+        for k in ['frames','targets','inputs','outputs']:
+            if k in kwargs:
+                teacher[k]=kwargs[k]
+            elif hasattr(self.evalfunc,k):
+                teacher[k]=getattr(self.evalfunc,k)
+        if 'frames' not in teacher or 'targets' not in teacher or numpy is None:
+            self.TrainingEpoch_Evolve()
+            return
+        frames=teacher['frames']
+        targets=teacher['targets']
+        inputs=teacher.get('inputs')
+        if inputs is None:
+            inputs=list(self.net.inRefs)
+        outputs=teacher.get('outputs')
+        if outputs is None:
+            outputs=list(self.net.outRefs)
+        learnRate=self.learnRate
         if 'learnRate' in kwargs:
             learnRate=kwargs['learnRate']
+        window=self.window
+        if 'window' in kwargs:
+            window=kwargs['window']
+        if not window:
+            window=max(1,len(frames))
 
-        # Not done yet
-        
-        self.solutions[0]=((curWt,curSt),curRk)
-        
+        ((curWt,curSt),curRk)=self.solutions[0]
+        self.loadWeights(curWt)
+        self.loadState(curSt)
+        # judge the step against the incumbent scored as it will be
+        rescored=self.evaluator(self.net)
+        if (not isinstance(rescored,PartialFitness) and math.isfinite(rescored)
+            and rescored!=curRk):
+            self.solutions.refit(0,rescored)
+            self.rank=self.solutions.fitnessAt(0)
+            curRk=rescored
+        self.loadState(curSt)
+        engine=self.gradientEngine()
+        weights=self.net.connections.weights
+        step=learnRate*self.stepScale
+        for first in range(0,len(frames),window):
+            error,grad=engine.gradient(frames[first:first+window],
+                                       targets[first:first+window],
+                                       inputs,outputs)
+            self.loadWeights(numpy.frombuffer(weights,dtype=numpy.float64)-step*grad)
+
+        # score the new weights from the best solution's state
+        searchTerm={'w':curWt,'s':curSt,'r':curRk}
+        mutant=self.saveWeights()
+        self.loadState(curSt)
+        rk=self.evaluator(self.net,
+                          original=curWt,
+                          current=mutant,
+                          originalFitness=curRk)
+        self.considerMutant(searchTerm,mutant,rk)
+        if rk>curRk:
+            self.stepScale=min(1.0,self.stepScale*1.25)
+        else:
+            self.stepScale*=0.5
+            if self.stepScale<2.0**-10:
+                # steps this small no longer move the fitness
+                self.stepScale=1.0
+            self.loadWeights(curWt)
+        self.epochs+=1
+        self.autoCheckpoint()
+
+    def gradientEngine(self):
+        """
+        Compiled network for TrainingEpoch_Backprop: the Topology's
+        own engine when it computes gradients, otherwise a
+        NumpyEngine kept until connections are added (gradient()
+        takes the weights as they are at each call, so weight
+        changes, which also move Connections.version, need no
+        recompile)
+        """
+        if self.net.engine is not None:
+            engine=self.net.compileEngine()
+            if hasattr(engine,'gradient'):
+                return engine
+        # connections are never removed so their count (and the
+        # state's) changes with every change of structure
+        structure=(len(self.net.connections),len(self.net.state))
+        if self.backpropEngine is None or self.backpropEngine[0]!=structure:
+            from lstm_engine import NumpyEngine
+            self.backpropEngine=(structure,NumpyEngine(self.net))
+        return self.backpropEngine[1]
 
     def TrainingEpoch_Evolve(self):
-        sol=self.solutions[0]
         #self.loadSnapshot(self.solutions[0][0])
-        self.loadWeights(self.solutions[0][0][0])
+        self.loadWeights(self.solutions.weightsAt(0))
         TS_now=self.saveState()
         curTerm={'w':self.saveWeights(),'s':TS_now,'r':self.rank}
-        searchTerm={'w':self.saveWeights(),'s':TS_now,'r':self.rank}
+        # t: the timestamp mutants are tested at unless time travelling
+        searchTerm={'w':self.saveWeights(),'s':TS_now,'r':self.rank,'t':TS_now}
+        past=self.pastTimestamps(TS_now)
         # create some mutations
-        mutantCount=1000
-        # maximum random mutation operators per gene
-        mCount=len(self.solutions)+len(self.net.connections)
+        mutantCount=self.mutantCount
         alternate=0
         # will cylce good/bad affects
         oscillateAlternate=1
@@ -953,154 +2356,537 @@ class OOPS:
             # won't be modified at all on first
             # pass and thus wasted
             oscillateAlternate=0
-        for mutantId in range(mutantCount):
-            self.testId="Mutant_%s" % (str(1000-mutantId).rjust(4,"0"))
-            # pick a random first parent
-            mutant=[]+self.solutions[
-                round((len(self.solutions)-1)*(1.0-math.cos(EntropySource.uniform(0.0,halfPi))))
-                ][0][0]
-            #mutant=[]+self.solutions[0][0][0]
-            mutationCount=round(EntropySource.uniform(1,mCount))
-            # splice (mating to second random parent)
-            self.mutationOps[0](mutant)
-            egg=[]+mutant
-            # mutate mutant
-            """
-            for mutations in range(mutationCount):
-                # apply randomly chosen mutation operator (other than splice)
-                op=round(EntropySource.uniform(1,len(self.mutationOps)-1))
-                self.mutationOps[op](mutant)
-            """
-            for idx in range(len(mutant)):
-                new=EntropySource.uniform(-2,2)
-                org=mutant[idx]
-                aff=self.weightAffect[idx]**2.0
-                if (alternate==0):
-                    # mutate "good" weights
-                    # aff=0.0 is org, aff=1.0 is new
-                    mutant[idx]=org*(1.0-aff)+new*aff
-                else:
-                    # mutate "bad" weights
-                    # aff=1.0 is org, aff=0.0 is new
-                    mutant[idx]=org*aff+new*(1.0-aff)
-            """
-            scribe=[]+egg
-            for idx in range(len(mutant)):
-                scribe[idx]=mutant[idx]
-                self.loadWeights(scribe)
-                scribe[idx]=egg[idx]
-                self.loadState(TS_now)
+        if self.batchSize>1 and numpy is not None:
+            # breed and test each batch as a (K,E) mutant matrix
+            for first in range(0,mutantCount,self.batchSize):
+                count=min(self.batchSize,mutantCount-first)
+                alternates=oscillateAlternate*(numpy.arange(first,first+count)%2)
+                mutants=self.breedPopulation(alternates).tolist()
+                self.evolveBatch(searchTerm,mutants,first)
+                self.travel(searchTerm,mutants,past)
+        else:
+            pending=[]
+            for mutantId in range(mutantCount):
+                self.testId="Mutant_%s" % (str(1000-mutantId).rjust(4,"0"))
+                mutant=self.breedMutant(alternate)
+                """
+                scribe=[]+egg
+                for idx in range(len(mutant)):
+                    scribe[idx]=mutant[idx]
+                    self.loadWeights(scribe)
+                    scribe[idx]=egg[idx]
+                    self.loadState(TS_now)
+                    rk=self.evaluator(self.net,
+                                      original=searchTerm['w'],
+                                      current=scribe,
+                                      originalFitness=searchTerm['r'])
+                    if rk>searchTerm['r']:
+                        searchTerm['w']=[]+mutant
+                        searchTerm['s']=TS_now
+                        searchTerm['r']=rk
+                        log.log(log.last(),which='solveLog')
+                        self.solutions.insert(searchTerm['w'],searchTerm['s'],searchTerm['r'])
+                        self.rank=rk
+                        self.currentSolves+=1
+                """
+                alternate=oscillateAlternate-alternate
+                if self.batchSize>1 or self.executor is not None:
+                    # test at TS_now together with the rest of the batch
+                    # (the pool evaluates even a batch of one)
+                    pending.append(mutant)
+                    if len(pending)==self.batchSize or mutantId==mutantCount-1:
+                        self.evolveBatch(searchTerm,pending,mutantId+1-len(pending))
+                        self.travel(searchTerm,pending,past)
+                        pending=[]
+                    continue
+                # test at TS_now
+                self.loadWeights(mutant)
+                #self.loadState(TS_now)
                 rk=self.evaluator(self.net,
                                   original=searchTerm['w'],
-                                  current=scribe,
+                                  current=mutant,
                                   originalFitness=searchTerm['r'])
-                if rk>searchTerm['r']:
-                    searchTerm['w']=[]+mutant
-                    searchTerm['s']=TS_now
-                    searchTerm['r']=rk
-                    log.log(log.last(),which='solveLog')
-                    self.solutions=[((searchTerm['w'],searchTerm['s']),searchTerm['r'])]+\
-                                    self.solutions[0:self.maxSolutions-1]
-                    self.rank=rk
-                    self.currentSolves+=1
-            """
-            alternate=oscillateAlternate-alternate
-            # test at TS_now
-            self.loadWeights(mutant)
-            #self.loadState(TS_now)
-            rk=self.evaluator(self.net,
-                              original=searchTerm['w'],
-                              current=mutant,
-                              originalFitness=searchTerm['r'])
-            if rk>searchTerm['r']:
-                searchTerm['w']=[]+mutant
-                searchTerm['s']=TS_now
-                searchTerm['r']=rk
-                log.log(log.last(),which='solveLog')
-                self.solutions=[((searchTerm['w'],searchTerm['s']),searchTerm['r'])]+\
-                                self.solutions[0:self.maxSolutions-1]
-                self.rank=rk
-                self.currentSolves+=1
+                self.considerMutant(searchTerm,mutant,rk)
+                self.travel(searchTerm,[mutant],past)
         # if we found anything better store the best solution
         if searchTerm['r']>curTerm['r']:
             self.loadWeights(searchTerm['w'])
             #self.loadState(searchTerm['s'])
+            if past:
+                # the best may have been found in the past
+                self.loadState(searchTerm['s'])
             self.rank=searchTerm['r']
+        self.epochs+=1
+        self.autoCheckpoint()
+
+    def saveCheckpoint(self,path):
+        """
+        Saves everything needed to resume training to path
+        (see lstm_checkpoint)
+        """
+        import lstm_checkpoint
+        lstm_checkpoint.save(self,path)
+
+    def loadCheckpoint(self,path):
+        """
+        Resumes from a checkpoint made by saveCheckpoint() for the
+        same Topology: the next TrainingEpoch_Evolve continues
+        exactly as it would have in the saving trainer
+        """
+        import lstm_checkpoint
+        lstm_checkpoint.load(self,path)
+
+    def autoCheckpoint(self):
+        """
+        Saves to the checkpoint file every checkpointEvery epochs
+        """
+        if self.checkpoint is not None and self.epochs%self.checkpointEvery==0:
+            self.saveCheckpoint(self.checkpoint)
+
+    def TrainingEpoch_SteadyState(self):
+        """
+        Steady state evolution
+
+        Where TrainingEpoch_Evolve breeds a generation from the
+        solutions as they were when the epoch began, here each
+        mutant is bred from the live solution store and each result
+        goes into the store as soon as it is known: as in
+        considerMutant, a mutant that beats the best stored solution
+        is inserted at the timestamp it was tested at (so the store
+        does not fill with near copies of the incumbent).  The best
+        stored fitness is the Budget bar.
+
+        Each call scores mutantCount mutants.  With an Executor the
+        pool is kept busy: as each evaluation finishes a new mutant
+        is bred and submitted so pool.workers evaluations are always
+        in flight.  Those still in flight when the call returns are
+        collected by the next call so workers are never idle between
+        epochs.  (They are lost to changeEvaluator and checkpoints.)
+
+        Select it as the trainer's epoch with:
+
+            Trainer.TrainingEpoch=Trainer.TrainingEpoch_SteadyState
+        """
+        start=self.saveState()
+        if self.executor is None:
+            for mutantId in range(self.mutantCount):
+                self.testId="Mutant_%s" % (str(1000-mutantId).rjust(4,"0"))
+                mutant=self.breedSteady()
+                self.loadWeights(mutant)
+                self.loadState(start)
+                rk=self.evaluator(self.net,
+                                  original=self.solutions.weightsAt(0),
+                                  current=mutant,
+                                  originalFitness=self.solutions.fitnessAt(0),
+                                  bar=self.steadyBar())
+                self.settleMutant(mutant,start,rk)
+        else:
+            if self.pool is None:
+                self.pool=self.executor(self.net,self.evalfunc)
+            done=0
+            while done<self.mutantCount:
+                while len(self.inFlight)<self.pool.workers:
+                    mutant=self.breedSteady()
+                    self.inFlight.append((self.pool.submit(mutant,start,self.steadyBar()),mutant,start))
+                finished,waiting=wait([job[0] for job in self.inFlight],return_when=FIRST_COMPLETED)
+                for job in [job for job in self.inFlight if job[0] in finished]:
+                    self.inFlight.remove(job)
+                    future,mutant,tested=job
+                    rk,final=future.result()
+                    if isinstance(rk,PartialFitness):
+                        self.partialEvaluations+=1
+                    self.testId="Mutant_%s" % (str(1000-done).rjust(4,"0"))
+                    self.scoreResult(rk,
+                                     original=self.solutions.weightsAt(0),
+                                     current=mutant,
+                                     originalFitness=self.solutions.fitnessAt(0))
+                    self.settleMutant(mutant,tested,rk)
+                    done+=1
+        self.loadWeights(self.solutions.weightsAt(0))
+        self.epochs+=1
+        self.autoCheckpoint()
+
+    def breedSteady(self):
+        """
+        Next steady state mutant, alternating good/bad affect
+        """
+        if self.affectInit:
+            self.steadyAlternate=0
+        mutant=self.breedMutant(self.steadyAlternate)
+        self.steadyAlternate=1-self.steadyAlternate
+        return mutant
+
+    def steadyBar(self):
+        """
+        Fitness a mutant must beat to enter the solution store: the
+        best stored one
+        """
+        return self.solutions.fitnessAt(0)
+
+    def settleMutant(self,mutant,state,rk):
+        """
+        Inserts a scored mutant into the solution store when it
+        improves on the best solution
+        """
+        if isinstance(rk,PartialFitness):
+            # stopped below the bar
+            return
+        if rk<=self.steadyBar():
+            return
+        log.log(log.last(),which='solveLog')
+        self.solutions.insert(mutant,state,rk)
+        self.rank=rk
+        self.currentSolves+=1
+
+    def evolveBatch(self,searchTerm,pending,first):
+        """
+        Tests a batch of mutants at the current timestamp, first is
+        the mutant number of pending[0]
+        """
+        ranks=self.evaluatePopulation(pending,searchTerm['r'])
+        if numpy is None:
+            for offset,(mutant,rk) in enumerate(zip(pending,ranks)):
+                self.testId="Mutant_%s" % (str(1000-first-offset).rjust(4,"0"))
+                self.scoreResult(rk,
+                                 original=searchTerm['w'],
+                                 current=mutant,
+                                 originalFitness=searchTerm['r'])
+                self.considerMutant(searchTerm,mutant,rk)
+            return
+        # the search term each mutant is compared against
+        originals=[]
+        bars=[]
+        bestW,bestR=searchTerm['w'],searchTerm['r']
+        for mutant,rk in zip(pending,ranks):
+            originals.append(bestW)
+            bars.append(bestR)
+            if rk>bestR:
+                bestW,bestR=mutant,rk
+        self.scorePopulation(ranks,originals,pending,bars)
+        for offset,(mutant,rk) in enumerate(zip(pending,ranks)):
+            self.testId="Mutant_%s" % (str(1000-first-offset).rjust(4,"0"))
+            for observer in self.observers:
+                observer.evaluated(self,rk,
+                                   original=originals[offset],
+                                   current=mutant,
+                                   originalFitness=bars[offset])
+            self.considerMutant(searchTerm,mutant,rk)
+
+    def pastTimestamps(self,now):
+        """
+        Up to timeTravel distinct CEC states of the stored solutions
+        other than now, fittest first
+        """
+        if not self.timeTravel:
+            return []
+        store=self.solutions
+        now=store.pack(now)
+        seen=set()
+        found=[]
+        for rank in range(len(store)):
+            slot=store.stateSlotAt(rank)
+            if slot in seen:
+                continue
+            seen.add(slot)
+            stamp=store.snapshot(slot)
+            if stamp!=now:
+                found.append(stamp.tolist())
+                if len(found)==self.timeTravel:
+                    break
+        return found
+
+    def travel(self,searchTerm,mutants,stamps):
+        """
+        Search step 4: tests mutants at the past timestamps stamps,
+        any better result replaces the search term (at its
+        timestamp).  Only the fitness range is updated (not weight
+        affect) since the mutants' weights were already credited at
+        the current timestamp.
+        """
+        if not stamps or not mutants:
+            return
+        grid=self.evaluateGrid(mutants,stamps,searchTerm['r'])
+        for mutant,ranks in zip(mutants,grid):
+            for stamp,rk in zip(stamps,ranks):
+                if not isinstance(rk,PartialFitness) and math.isfinite(rk):
+                    self.minFitness=min(self.minFitness,rk)
+                    self.maxFitness=max(self.maxFitness,rk)
+                self.considerMutant(searchTerm,mutant,rk,stamp)
+
+    def evaluateGrid(self,mutants,states,bar=None,rows=4096):
+        """
+        Scores every mutant starting from every state (saveState()
+        vectors), returns M lists of T fitnesses
+
+        With batchSize>1 (so an engine) the (mutants x states) cross
+        product is run as populations of at most rows candidates:
+        each mutant's weights are repeated over a block of rows each
+        starting from its own state, so the evaluator (written as for
+        evaluatePopulation) scores all of them together.  With an
+        Executor the whole grid goes to the pool in one call
+        (pool.evaluateGrid; a pool without it gets one batch per
+        state); otherwise each pair is evaluated in turn, as a
+        scalar evaluator expects.
+
+        The Topology's weights and state are restored afterwards.
+        """
+        M=len(mutants)
+        T=len(states)
+        saved=self.saveSnapshot()
+        grid=[[None]*T for m in range(M)]
+        try:
+            if self.executor is not None:
+                if self.pool is None:
+                    self.pool=self.executor(self.net,self.evalfunc)
+                if hasattr(self.pool,'evaluateGrid'):
+                    for m,row in enumerate(self.pool.evaluateGrid(mutants,states,bar)):
+                        grid[m]=[rk for (rk,final) in row]
+                else:
+                    for t,state in enumerate(states):
+                        for m,(rk,final) in enumerate(self.pool.evaluate(mutants,state,bar)):
+                            grid[m][t]=rk
+            elif self.batchSize>1 and numpy is not None:
+                engine=self.net.compileEngine()
+                W=numpy.asarray(mutants,dtype=numpy.float64)
+                S=numpy.asarray(states,dtype=numpy.float64)
+                step=max(1,rows//T)
+                for first in range(0,M,step):
+                    block=W[first:first+step]
+                    engine.loadPopulation(numpy.repeat(block,T,axis=0),
+                                          numpy.tile(S,(len(block),1)))
+                    try:
+                        ranks,stopped=budgeted(self.evalfunc,self.net,bar,self.budgeted)
+                    finally:
+                        engine.dropPopulation()
+                    kind=PartialFitness if stopped else float
+                    ranks=numpy.asarray(ranks,dtype=numpy.float64).reshape(len(block),T)
+                    for m,row in enumerate(ranks.tolist()):
+                        grid[first+m]=[kind(rk) for rk in row]
+            else:
+                for m,mutant in enumerate(mutants):
+                    self.loadWeights(mutant)
+                    for t,state in enumerate(states):
+                        self.loadState(state)
+                        grid[m][t]=self.score(self.net,bar)
+                # score() has counted the partial results
+                return grid
+        finally:
+            self.loadSnapshot(saved)
+        self.partialEvaluations+=sum(isinstance(rk,PartialFitness) for row in grid for rk in row)
+        return grid
+
+    def breedMutant(self,alternate):
+        """
+        Breeds one mutant (list): a parent picked from the solutions,
+        spliced with a second one then blended by weight affect
+        (alternate: 0 mutates "good" weights, 1 "bad" ones)
+        """
+        # maximum random mutation operators per gene
+        mCount=len(self.solutions)+len(self.net.connections)
+        # pick a random first parent
+        mutant=self.solutions.weightsAt(
+            round((len(self.solutions)-1)*(1.0-math.cos(self.entropy.uniform(0.0,halfPi))))
+            )
+        #mutant=[]+self.solutions[0][0][0]
+        mutationCount=round(self.entropy.uniform(1,mCount))
+        # splice (mating to second random parent)
+        self.mutationOps[0](mutant)
+        # mutate mutant
+        """
+        for mutations in range(mutationCount):
+            # apply randomly chosen mutation operator (other than splice)
+            op=round(self.entropy.uniform(1,len(self.mutationOps)-1))
+            self.mutationOps[op](mutant)
+        """
+        news=self.uniforms(-2,2,len(mutant))
+        affects=self.affects()
+        for idx in range(len(mutant)):
+            new=news[idx]
+            org=mutant[idx]
+            aff=affects[idx]**2.0
+            if (alternate==0):
+                # mutate "good" weights
+                # aff=0.0 is org, aff=1.0 is new
+                mutant[idx]=org*(1.0-aff)+new*aff
+            else:
+                # mutate "bad" weights
+                # aff=1.0 is org, aff=0.0 is new
+                mutant[idx]=org*aff+new*(1.0-aff)
+        return mutant
+
+    def breedPopulation(self,alternates):
+        """
+        Breeds a (K,E) mutant matrix the way TrainingEpoch_Evolve
+        breeds single mutants: a parent picked from the solutions,
+        spliced with a second one then blended by weight affect.
+        alternates holds the good/bad affect choice of each row.
+        """
+        mutants=self.parentMatrix(self.pickRanks(len(alternates)))
+        self.mutateBatchSplice(mutants)
+        self.blendAffect(mutants,alternates)
+        return mutants
+
+    def pickRanks(self,count):
+        """
+        count solution ranks skewed toward the fittest
+        """
+        skew=1.0-numpy.cos(self.generator().uniform(0.0,halfPi,count))
+        return numpy.rint(skew*(len(self.solutions)-1)).astype(numpy.intp)
+
+    def parentMatrix(self,ranks):
+        """
+        (K,E) copy of the weight vectors of the solutions at ranks
+        """
+        rows=[self.solutions.rowOf(rank) for rank in ranks]
+        return self.solutions.weightMatrix()[rows].astype(numpy.float64)
+
+    def blendAffect(self,chroms,alternates):
+        """
+        Blends each row of chroms toward new random weights
+        by weight affect
+
+            alternates[k]==0: mutate "good" weights
+                              aff=0.0 is org, aff=1.0 is new
+            otherwise:        mutate "bad" weights
+                              aff=1.0 is org, aff=0.0 is new
+        """
+        aff=numpy.array(self.affects())**2.0
+        aff=numpy.where(numpy.asarray(alternates)[:,numpy.newaxis]==0,aff,1.0-aff)
+        news=self.generator().uniform(-2,2,chroms.shape)
+        chroms*=1.0-aff
+        chroms+=news*aff
+        return chroms
+
+    def considerMutant(self,searchTerm,mutant,rk,state=None):
+        """
+        Records mutant as a solution when it beats the search term
+
+            state: timestamp mutant was tested at (default the
+                   search term's 't' or, failing that, 's')
+        """
+        if rk>searchTerm['r']:
+            if state is None:
+                state=searchTerm.get('t',searchTerm['s'])
+            searchTerm['w']=[]+mutant
+            searchTerm['s']=state
+            searchTerm['r']=rk
+            log.log(log.last(),which='solveLog')
+            self.solutions.insert(searchTerm['w'],searchTerm['s'],searchTerm['r'])
+            self.rank=rk
+            self.currentSolves+=1
 
     def mutateTumor(self,chrom):
         # similar to Radical but affects a
         # randomly chosen section of the victim
-        p1=round(EntropySource.uniform(0,len(chrom)))
+        p1=round(self.entropy.uniform(0,len(chrom)))
         p2=p1
         while p2==p1:
-            p2=round(EntropySource.uniform(0,len(chrom)))
+            p2=round(self.entropy.uniform(0,len(chrom)))
         lhs=min(p1,p2)
         rhs=max(p1,p2)
         ugly=[0.0]*(rhs-lhs)
         for c in range(rhs-lhs):
-            radical=EntropySource.uniform(-6.0,6.0)
+            radical=self.entropy.uniform(-6.0,6.0)
             ugly[c]=radical
         chrom[lhs:rhs]=ugly
     def mutateRadical(self,chrom):
-        where=round(EntropySource.uniform(0,len(chrom)-1))
-        radical=EntropySource.uniform(-6.0,6.0)
+        where=round(self.entropy.uniform(0,len(chrom)-1))
+        radical=self.entropy.uniform(-6.0,6.0)
         chrom[where]=radical
         return chrom
     def mutateSign(self,chrom):
-        where=round(EntropySource.uniform(0,len(chrom)-1))
+        where=round(self.entropy.uniform(0,len(chrom)-1))
         chrom[where]=-chrom[where]
         return chrom
     def mutateSplice(self,chrom):
         nSol=len(self.solutions)
-        which=1.0-math.cos(EntropySource.uniform(0.0,halfPi))
+        which=1.0-math.cos(self.entropy.uniform(0.0,halfPi))
         which=round(which*float(nSol-1))
-        ((other,sS),sR)=self.solutions[which]
-        picked=[False]*len(chrom)
-        for transcribe in range(int(len(chrom)/2)):
-            k=round(EntropySource.uniform(0,len(chrom)-1))
-            while picked[k]:
-                k=round(EntropySource.uniform(0,len(chrom)-1))
-            picked[k]=True
+        other=self.solutions.weightsAt(which)
+        for k in self.sampleIndices(len(chrom),int(len(chrom)/2)):
             chrom[k]=other[k]
         return chrom
     def mutateSwap(self,chrom):
-        a=round(EntropySource.uniform(0,len(chrom)-1))
+        a=round(self.entropy.uniform(0,len(chrom)-1))
         b=a
         while b==a:
-            b=round(EntropySource.uniform(0,len(chrom)-1))
+            b=round(self.entropy.uniform(0,len(chrom)-1))
         temp=chrom[a]
         chrom[a]=chrom[b]
         chrom[b]=temp
         return chrom
     def mutateTranspose(self,chrom):
-        a=round(EntropySource.uniform(0,len(chrom)-1))
+        a=round(self.entropy.uniform(0,len(chrom)-1))
         b=(a+1) % len(chrom)
         temp=chrom[a]
         chrom[a]=chrom[b]
         chrom[b]=temp
         return chrom
-            
+
+    """
+    Batch operators: each applies its operator above to every
+    row of a (K,E) numpy mutant matrix at once (in place)
+    """
+    def mutateBatchTumor(self,chroms):
+        K,E=chroms.shape
+        rng=self.generator()
+        p1=rng.integers(0,E+1,K)
+        p2=(p1+rng.integers(1,E+1,K))%(E+1)
+        cols=numpy.arange(E)
+        ugly=(cols>=numpy.minimum(p1,p2)[:,numpy.newaxis])&(cols<numpy.maximum(p1,p2)[:,numpy.newaxis])
+        chroms[ugly]=rng.uniform(-6.0,6.0,int(ugly.sum()))
+        return chroms
+    def mutateBatchRadical(self,chroms):
+        K,E=chroms.shape
+        rng=self.generator()
+        chroms[numpy.arange(K),rng.integers(0,E,K)]=rng.uniform(-6.0,6.0,K)
+        return chroms
+    def mutateBatchSign(self,chroms):
+        K,E=chroms.shape
+        where=(numpy.arange(K),self.generator().integers(0,E,K))
+        chroms[where]=-chroms[where]
+        return chroms
+    def mutateBatchSplice(self,chroms):
+        K,E=chroms.shape
+        other=self.parentMatrix(self.pickRanks(K))
+        half=int(E/2)
+        if half==0:
+            return chroms
+        # a random half of each row's positions
+        picked=numpy.argpartition(self.generator().random((K,E)),half-1,axis=1)[:,:half]
+        rows=numpy.arange(K)[:,numpy.newaxis]
+        chroms[rows,picked]=other[rows,picked]
+        return chroms
+    def mutateBatchSwap(self,chroms):
+        K,E=chroms.shape
+        if E<2:
+            return chroms
+        rng=self.generator()
+        a=rng.integers(0,E,K)
+        b=(a+rng.integers(1,E,K))%E
+        return self.swapColumns(chroms,a,b)
+    def mutateBatchTranspose(self,chroms):
+        K,E=chroms.shape
+        a=self.generator().integers(0,E,K)
+        return self.swapColumns(chroms,a,(a+1)%E)
+    def swapColumns(self,chroms,a,b):
+        rows=numpy.arange(chroms.shape[0])
+        temp=chroms[rows,a]
+        chroms[rows,a]=chroms[rows,b]
+        chroms[rows,b]=temp
+        return chroms
+
     def saveWeights(self):
-        return []+[self.net.connections[edge] for edge in sorted(self.net.connections)]
+        return self.net.saveWeights()
     def saveState(self):
-        nodes=self.net.nodeRefs
-        return []+[n.CEC for n in nodes]+[n.states['output'] for n in nodes]
+        return self.net.saveState()
     def saveSnapshot(self):
         return (self.saveWeights(),self.saveState())
     
     def loadWeights(self,Wts):
-        idx=0
-        for edge in self.net.connections:
-            self.net.connections[edge]=Wts[idx]
-            idx=idx+1
+        self.net.loadWeights(Wts)
     def loadState(self,innerState):
-        skip=int(len(innerState)/2)
-        idx=0
-        for n in self.net.nodeRefs.keys():
-            n.CEC=innerState[idx]
-            n.states['peephole']=sigmoid(n.CEC)
-            n.states['output']=innerState[idx+skip]
-            idx=idx+1
+        self.net.loadState(innerState)
     def loadSnapshot(self,snap):
         Wts,CECs=snap
         self.loadWeights(Wts)
@@ -1109,6 +2895,7 @@ class OOPS:
 
 if __name__ == "__main__":
 
+    visualizer=None
     try:
 
         from pprint import PrettyPrinter    
@@ -1193,7 +2980,7 @@ if __name__ == "__main__":
             print("%s --> %s W=%s" % (lhs.rjust(15),rhs.ljust(15),w))
         """
 
-        def Tester(theNet,test=""):
+        def Tester(theNet,test="",budget=None):
             global testlog
             # learn test string
             # the outputs scaled to range 0..255 and rounded to get ASCII
@@ -1218,13 +3005,22 @@ if __name__ == "__main__":
                 of2=outputs[0].read()*255.0
                 eTerms+=(of2-of1)*(of2-of1)
                 result=result+chr(o2)
+                # error only grows: stop once this can't win
+                if budget is not None and budget.exhausted(-math.sqrt(eTerms)):
+                    break
             eDist=math.sqrt(float(eTerms))
             fitness=-eDist
-            log.log("'%s':'%s', fitness=%s" % (test,result,fitness))
+            log.log("'%s':'%s', fitness=%s",test,result,fitness)
             # negate so higher error = lower fitness
             return fitness
         
         Trainer=OOPS(Topology=net,Evaluator=Tester)
+        try:
+            from lstm_visual import Visualizer
+            visualizer=Visualizer()
+            Trainer.attach(visualizer)
+        except ImportError:
+            pass
 
         test="Hello, World!"
 
@@ -1235,13 +3031,13 @@ if __name__ == "__main__":
         #for pfx in [len(test)-1]:
             subTest=partial(Tester,test=test[0:pfx+1])
             Trainer.changeEvaluator(subTest)
-            while round(Trainer.solutions[0][1])<0:
+            while round(Trainer.solutions.fitnessAt(0))<0:
                 solves=Trainer.currentSolves
                 Trainer.TrainingEpoch()
                 newSolves=Trainer.currentSolves-solves
                 lastSolve=log.last('solveLog')
                 if newSolves>0:
-                    gotcha=["+","-"][round(Trainer.solutions[0][1])<0]
+                    gotcha=["+","-"][round(Trainer.solutions.fitnessAt(0))<0]
                     print("Epoch %s %s %s (%s solutions)" % (str(epoch).rjust(12,'0'),
                           gotcha,lastSolve,len(Trainer.solutions)))
                 epoch+=1
@@ -1249,4 +3045,5 @@ if __name__ == "__main__":
             #Trainer.solutions=[]+prefixes
 
     finally:
-        pygame.quit()
+        if visualizer is not None:
+            visualizer.close()
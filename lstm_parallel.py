@@ -0,0 +1,155 @@
+#! /usr/bin/python
+"""
+    Parallel fitness evaluation for the OOPS trainer.
+
+    An EvaluationPool holds private copies of a Topology and its
+    evaluator, shipped once to each worker.  Afterwards only weight
+    vectors and CEC snapshots (as Topology.saveWeights() and
+    Topology.saveState() produce them) travel to the workers and
+    fitness values come back.
+
+    Give the trainer a pool factory to use it:
+
+        from lstm_parallel import EvaluationPool
+        Trainer=OOPS(Topology=net,Evaluator=Tester,
+                     Executor=partial(EvaluationPool,kind='process',workers=32),
+                     batchSize=64)
+
+    The pool works through a batch at a time: with the default
+    batchSize=1 the search is exactly the sequential one but only
+    one worker is ever busy.
+
+    Copyright (C) 2013 Christopher BRIAN Jack (gau_veldt@hotmail.com)
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import os
+import pickle
+import threading
+from concurrent.futures import Future,ThreadPoolExecutor,ProcessPoolExecutor
+
+from lstm_oops import PartialFitness,budgeted,takesBudget
+
+# each worker thread (or process) keeps its own replica
+_replica=threading.local()
+
+class Replica:
+    """
+    A private copy of a Topology and the evaluator bound to it
+    """
+    def __init__(self,payload):
+        self.net,self.evalfunc=pickle.loads(payload)
+        self.takes=takesBudget(self.evalfunc)
+
+    def evaluate(self,job):
+        """
+        job: (weights,state,bar) returns (fitness,final state)
+        """
+        Wts,state,bar=job
+        self.net.loadWeights(Wts)
+        self.net.loadState(state)
+        rank,stopped=budgeted(self.evalfunc,self.net,bar,self.takes)
+        if stopped:
+            rank=PartialFitness(rank)
+        return (rank,self.net.saveState())
+
+def _install(payload):
+    _replica.current=Replica(payload)
+
+def _evaluate(job):
+    return _replica.current.evaluate(job)
+
+
+class EvaluationPool:
+    """
+    Evaluates weight vectors on worker copies of a Topology
+
+        net      - Topology to replicate
+        evalfunc - the trainer's evaluator
+        kind     - 'serial' (default), 'thread' or 'process'
+        workers  - worker count (default os.cpu_count())
+
+    The Topology and evaluator are pickled together so an
+    evaluator holding Input/Output terminals keeps referring to the
+    replica's terminals.  This means the evaluator must be picklable:
+    a module level function or a partial or object of one rather than
+    a closure.  Thread workers each get their own replica too since
+    node states cannot be shared between concurrent evaluations.
+    """
+    def __init__(self,net,evalfunc,kind='serial',workers=None):
+        try:
+            payload=pickle.dumps((net,evalfunc))
+        except (pickle.PicklingError,AttributeError,TypeError) as err:
+            raise TypeError("EvaluationPool: evaluator must be picklable with its Topology (%s)" % err)
+        self.kind=kind
+        self.workers=workers or os.cpu_count() or 1
+        if kind=='serial':
+            self.workers=1
+            self.replica=Replica(payload)
+            self.executor=None
+        elif kind=='thread':
+            self.executor=ThreadPoolExecutor(self.workers,initializer=_install,initargs=(payload,))
+        elif kind=='process':
+            self.executor=ProcessPoolExecutor(self.workers,initializer=_install,initargs=(payload,))
+        else:
+            raise ValueError("EvaluationPool: unknown kind '%s'" % kind)
+
+    def evaluate(self,weights,state,bar=None):
+        """
+        Evaluates each weight vector starting from state
+        (bar: the Budget bar for evaluators that take one)
+
+        returns list of (fitness,final state) in weights order
+        """
+        return self.run([(Wts,state,bar) for Wts in weights])
+
+    def evaluateGrid(self,weights,states,bar=None):
+        """
+        Evaluates each weight vector starting from each state, all
+        as one batch of jobs (see OOPS.evaluateGrid)
+
+        returns M lists of T (fitness,final state)
+        """
+        T=len(states)
+        found=self.run([(Wts,state,bar) for Wts in weights for state in states])
+        return [found[m*T:(m+1)*T] for m in range(len(weights))]
+
+    def run(self,jobs):
+        """
+        (fitness,final state) of each (weights,state,bar) job
+        """
+        if self.executor is None:
+            return [self.replica.evaluate(job) for job in jobs]
+        if self.kind=='process':
+            chunk=max(1,len(jobs)//(4*self.workers))
+            return list(self.executor.map(_evaluate,jobs,chunksize=chunk))
+        return list(self.executor.map(_evaluate,jobs))
+
+    def submit(self,Wts,state,bar=None):
+        """
+        Starts evaluating one weight vector from state, returns a
+        concurrent.futures.Future of (fitness,final state)
+        (see OOPS.TrainingEpoch_SteadyState)
+        """
+        job=(Wts,state,bar)
+        if self.executor is None:
+            future=Future()
+            future.set_result(self.replica.evaluate(job))
+            return future
+        return self.executor.submit(_evaluate,job)
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor=None
@@ -0,0 +1,104 @@
+#! /usr/bin/python
+"""
+    pygame visualizer for the OOPS trainer.
+
+    Shows weight affects and the original/current weights of each
+    evaluated mutant.  The trainer itself never touches the display;
+    attach a Visualizer to watch a training run:
+
+        from lstm_visual import Visualizer
+        Trainer.attach(Visualizer())
+
+    Closing the window raises KeyboardInterrupt in the trainer.
+
+    Copyright (C) 2013 Christopher BRIAN Jack (gau_veldt@hotmail.com)
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import pygame
+
+from lstm_oops import sigmoid
+
+
+class Visualizer:
+    """
+    Trainer observer drawing weight affect bars
+
+    Redraws at most framerate times per second and only for
+    evaluations made against an original weight vector.
+    """
+    def __init__(self,size=(640,320),framerate=60.0):
+        pygame.init()
+        self.visual=pygame.display.set_mode(size,pygame.DOUBLEBUF)
+        self.elapsed=0
+        self.since=pygame.time.get_ticks()
+        self.framerate=1000.0/framerate
+        self.font=pygame.font.SysFont("courier",18)
+        self.textregion=pygame.Rect(0,230,640,30)
+
+    def pump(self):
+        """
+        Handles window events and advances the frame clock
+        """
+        for evt in pygame.event.get():
+            if evt.type == pygame.QUIT:
+                raise KeyboardInterrupt
+        now=pygame.time.get_ticks()
+        delta=now-self.since
+        self.elapsed+=delta
+        self.since=now
+
+    def evaluated(self,trainer,newRk,**kwargs):
+        """
+        Called by the trainer after each scored evaluation
+        """
+        self.pump()
+        if 'original' in kwargs and 'current' in kwargs:
+            if self.elapsed>self.framerate:
+                while self.elapsed>self.framerate:
+                    self.elapsed-=self.framerate
+                self.draw(trainer,kwargs['original'],kwargs['current'])
+            pygame.display.flip()
+
+    def draw(self,trainer,org,cur):
+        visual=self.visual
+        affects=trainer.affects()
+        weightCount=len(affects)
+        bgColor=(0,0,128)
+        divColor=(0,0,0)
+
+        r=pygame.Rect(16,10,6*weightCount-1,211)
+        pygame.draw.rect(visual,bgColor,r)
+        for x in range(weightCount):
+            bar=100*affects[x]
+            xbar=100-bar
+            #pygame.draw.line(visual,(255,0,0),(18+x*6,10), (18+x*6,10+xbar),5)
+            pygame.draw.line(visual,(0,255,0),(18+x*6,110),(18+x*6,110-bar),5)
+            prevBar=100*sigmoid(org[x])
+            xPrevBar=100-prevBar
+            curBar=100*sigmoid(cur[x])
+            xCurBar=100-curBar
+            pygame.draw.line(visual,bgColor,(16+x*6,120),(16+x*6,120+xPrevBar),2)
+            pygame.draw.line(visual,(255,0,255),  (16+x*6,220),(16+x*6,220-prevBar),2)
+            pygame.draw.line(visual,bgColor,(19+x*6,120),(19+x*6,120+xCurBar),2)
+            pygame.draw.line(visual,(128,0,255),  (19+x*6,220),(19+x*6,220-curBar),2)
+            if (x+1)<weightCount:
+                pygame.draw.line(visual,divColor,(21+x*6,10),(21+x*6,220),1)
+
+        nameImg=self.font.render(getattr(trainer,'testId',''),True,(160,160,224))
+        pygame.draw.rect(visual,(0,0,0),self.textregion)
+        visual.blit(nameImg,(16,234))
+
+    def close(self):
+        pygame.quit()